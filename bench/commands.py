@@ -0,0 +1,115 @@
+"""Per-command latency against synthetic economies of different sizes.
+
+Loads every cog into an offline bot (see bench/fakes.py), seeds N users
+into the store and one guild, then calls each command's callback over and
+over as a random member. Commands run one at a time, so the numbers are
+the cost of the command itself, not of contention.
+
+    python -m bench.commands --sizes 1000 100000 1000000 --iterations 2000
+
+`--durable` journals and fsyncs every commit like production does.
+`leaderboard (cold)` is the first call on a guild, which builds its
+boards; every later call reads the kept-up-to-date ones.
+"""
+import argparse
+import asyncio
+import gc
+import random
+import statistics
+import time
+
+from bench.fakes import FakeChannel, FakeContext, FakeGuild, FakeMessage, make_bot, make_store, seed_avatar, seed_economy
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def commands_for(bot, guild, channel):
+    """name -> coroutine function taking a random member"""
+    work, pets, fun, gamble, user = (bot.get_cog(name) for name in ("Work", "Pets", "Fun", "Gambling", "User"))
+
+    def command(cog, name, *args):
+        callback = bot.get_command(name).callback
+
+        async def run(member):
+            await callback(cog, FakeContext(bot, member, channel), *args)
+        return run
+
+    async def on_message(member):
+        await user.on_message(FakeMessage(member, channel, "just chatting"))
+
+    return {
+        "work": command(work, "work"),
+        "balance": command(work, "balance"),
+        "leaderboard (cold)": command(work, "leaderboard", 1, "money"),
+        "leaderboard": command(work, "leaderboard", 1, "money"),
+        "leaderboard (deep)": command(work, "leaderboard", max(1, len(guild.members) // 20), "money"),
+        "rank": command(work, "rank", None),
+        "rob": command(work, "rob", None),
+        "slots": command(gamble, "slots", 10),
+        "fish": command(fun, "fish"),
+        "feed": command(pets, "feed"),
+        "profile": command(user, "profile", None),
+        "on_message": on_message
+    }
+
+
+async def run_size(users, args):
+    store, workdir = make_store(durable=args.durable)
+    guild = FakeGuild()
+    channel = FakeChannel(guild=guild)
+
+    started = time.perf_counter()
+    seed_economy(store, guild, users, seed=args.seed)
+    bot = await make_bot(store)
+    await seed_avatar(bot)
+    store.start()
+    print(f"\n{users:,} users (seeded and loaded in {time.perf_counter() - started:.1f}s)")
+    print(f"{'command':<20} {'calls':>7} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'calls/s':>10}")
+
+    rng = random.Random(args.seed)
+    # Keep collections of the seeded economy from landing inside a timing
+    gc.collect()
+    gc.freeze()
+    try:
+        for name, run in commands_for(bot, guild, channel).items():
+            if args.only and name.split(" ")[0] not in args.only:
+                continue
+            calls = 1 if name.endswith("(cold)") else args.iterations
+            samples = []
+            wall = time.perf_counter()
+            for _ in range(calls):
+                member = guild.members[rng.randrange(users)]
+                begin = time.perf_counter()
+                await run(member)
+                samples.append((time.perf_counter() - begin) * 1000)
+            wall = time.perf_counter() - wall
+            print(
+                f"{name:<20} {calls:>7} {statistics.fmean(samples):>9.3f} {percentile(samples, 0.5):>9.3f} "
+                f"{percentile(samples, 0.99):>9.3f} {max(samples):>9.3f} {calls / wall:>10,.0f}"
+            )
+    finally:
+        gc.unfreeze()
+        for name in list(bot.extensions):
+            await bot.unload_extension(name)
+        store.close()
+        workdir.cleanup()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100_000, 1_000_000])
+    parser.add_argument("--iterations", type=int, default=2000, help="calls per command")
+    parser.add_argument("--only", nargs="+", help="just these commands, e.g. --only leaderboard on_message")
+    parser.add_argument("--durable", action="store_true", help="journal and fsync every commit")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for users in args.sizes:
+        await run_size(users, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
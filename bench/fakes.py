@@ -0,0 +1,189 @@
+"""Offline stand-ins for the Discord objects the cogs touch.
+
+Only what the cogs actually read is modelled. Nothing here talks to the
+network: commands.Bot is real but never logs in, and messages sent by a
+command are counted instead of delivered.
+"""
+import datetime
+import io
+import os
+import random
+import tempfile
+
+import discord
+from discord.ext import commands
+
+from utils.backends import JsonBackend
+from utils.cooldowns import Cooldowns
+from utils.journal import Journal
+from utils.metrics import Metrics
+from utils.ranking import GuildRankings
+from utils.records import UserRecord
+from utils.sessions import SessionRouter
+from utils.store import Store
+
+COGS = ("admin", "fun", "gamble", "pets", "user", "work")
+EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class FakeAsset:
+    __slots__ = ("key", "url")
+
+    def __init__(self, key):
+        self.key = key
+        self.url = f"https://cdn.invalid/avatars/{key}.png"
+
+    def with_static_format(self, _):
+        return self
+
+    def with_size(self, _):
+        return self
+
+
+class FakeMember:
+    __slots__ = ("id", "name", "guild", "bot")
+
+    # Same for every member, like users who kept the default avatar
+    display_avatar = FakeAsset("bench")
+    colour = discord.Colour.default()
+    created_at = EPOCH
+    joined_at = EPOCH
+
+    def __init__(self, member_id, guild, bot=False):
+        self.id = member_id
+        self.name = f"user{member_id}"
+        self.guild = guild
+        self.bot = bot
+
+    @property
+    def display_name(self):
+        return self.name
+
+    @property
+    def mention(self):
+        return f"<@{self.id}>"
+
+
+class FakeGuild:
+    # Every member is added up front, like a guild that finished chunking
+    chunked = True
+
+    def __init__(self, guild_id=1):
+        self.id = guild_id
+        self.members = []
+        self._by_id = {}
+
+    def add_member(self, member):
+        self.members.append(member)
+        self._by_id[member.id] = member
+
+    def get_member(self, member_id):
+        return self._by_id.get(member_id)
+
+    @property
+    def member_count(self):
+        return len(self.members)
+
+
+class FakeChannel:
+    """Counts what would have been sent"""
+
+    def __init__(self, channel_id=1, guild=None):
+        self.id = channel_id
+        self.guild = guild
+        self.sent = 0
+
+    async def send(self, content=None, **kwargs):
+        self.sent += 1
+
+
+class FakeMessage:
+    __slots__ = ("id", "author", "channel", "guild", "content")
+
+    # Read by commands.Context and argument parsing; nothing here uses them
+    _state = None
+    attachments = ()
+
+    def __init__(self, author, channel, content, message_id=0):
+        self.id = message_id
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.content = content
+
+
+class FakeContext:
+    __slots__ = ("bot", "author", "guild", "channel", "message")
+
+    def __init__(self, bot, author, channel):
+        self.bot = bot
+        self.author = author
+        self.guild = channel.guild
+        self.channel = channel
+        self.message = FakeMessage(author, channel, "")
+
+    async def send(self, content=None, **kwargs):
+        await self.channel.send(content, **kwargs)
+
+
+# ---------- Economy ----------
+def seed_economy(store, guild, users, seed=0):
+    """Fill `store` and `guild` with `users` members holding random balances"""
+    rng = random.Random(seed)
+    for index in range(users):
+        member_id = 10**17 + index
+        guild.add_member(FakeMember(member_id, guild))
+        record = UserRecord()
+        record.money = rng.randint(0, 50_000)
+        record.level = rng.randint(1, 40)
+        record.xp = rng.randint(0, 100 * record.level ** 2 - 1)
+        if index % 2:
+            record.pet, record.pet_name = "cat", f"cat{index}"
+        if index % 4 == 0:
+            record.profile_image = "galaxy.jpg"
+            record.owned_images = ["galaxy.jpg"]
+        store.data[str(member_id)] = record
+
+
+def make_store(durable=False):
+    """(store, workdir): a store in a throwaway directory; with `durable` every commit is journaled and fsynced.
+
+    Call workdir.cleanup() after store.close(), which snapshots the whole
+    seeded economy there.
+    """
+    workdir = tempfile.TemporaryDirectory(prefix="bench-")
+    backend = JsonBackend(os.path.join(workdir.name, "data.json"))
+    journal = Journal(os.path.join(workdir.name, "data.journal")) if durable else None
+    store = Store(backend, journal, flush_interval=300, batch_size=5000)
+    store.load()
+    return store, workdir
+
+
+async def make_bot(store, cogs=COGS, bot_class=commands.Bot):
+    """A real commands.Bot that never connects, with the shared state main.py sets up"""
+    bot = bot_class(command_prefix="!", intents=discord.Intents.default())
+    bot.store = store
+    bot.rankings = GuildRankings(store)
+    bot.cooldowns = Cooldowns()
+    bot.sessions = SessionRouter(bot)
+    bot.add_listener(bot.sessions.on_message)
+    bot.metrics = Metrics()
+    bot.metrics.install(bot)
+    bot.metrics.add_source("store", store.stats)
+    for name in cogs:
+        await bot.load_extension(f"cogs.{name}")
+    return bot
+
+
+async def seed_avatar(bot):
+    """Put the shared fake avatar in the avatar cache so !profile never downloads"""
+    from PIL import Image
+
+    from utils.avatars import AvatarEntry
+    from utils.cards import prepare_avatar
+
+    cog = bot.get_cog("User")
+    with io.BytesIO() as raw:
+        Image.new("RGB", (128, 128), "purple").save(raw, "PNG")
+        pixels = await cog.renderer.run(prepare_avatar, raw.getvalue())
+    cog.avatars.entries[FakeMember.display_avatar.key] = AvatarEntry(pixels, None, None)
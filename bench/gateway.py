@@ -0,0 +1,162 @@
+"""Synthetic gateway traffic through the bot's real dispatch path.
+
+Messages go in through `bot.dispatch("message", ...)`, the same call the
+gateway connection makes. From there every on_message listener runs
+(message XP, the game session router) and so does command processing.
+The traffic is mostly chat with some `!work`, `!slots` and `!lb` mixed in.
+
+    python -m bench.gateway --rate 2000 --duration 20 --users 50000
+
+Prints the rate actually sustained, event-loop lag, and command latency
+from dispatch to the command finishing. Push `--rate` up until lag and
+p99 latency take off to find the ceiling; `--rate 0` sends as fast as
+the loop allows.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from discord.ext import commands
+
+from bench.commands import percentile
+from bench.fakes import FakeChannel, FakeGuild, FakeMember, FakeMessage, make_bot, make_store, seed_economy
+
+# What a message says -> share of the traffic
+MIX = {
+    "just chatting": 0.90,
+    "!work": 0.04,
+    "!slots 10": 0.04,
+    "!lb": 0.02
+}
+
+
+class GatewayContext(commands.Context):
+    """Context whose replies go to the fake channel instead of the HTTP API"""
+
+    async def send(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+
+class GatewayBot(commands.Bot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bench_user = FakeMember(1, None, bot=True)
+        self.sent_at = {}  # message id -> perf_counter at dispatch
+        self.latencies = []
+        self.errors = 0
+        self.first_error = None
+
+    @property
+    def user(self):
+        return self.bench_user
+
+    async def get_context(self, origin, /, *, cls=GatewayContext):
+        return await super().get_context(origin, cls=cls)
+
+    async def on_command_completion(self, ctx):
+        self.latencies.append(time.perf_counter() - self.sent_at.pop(ctx.message.id))
+
+    async def on_command_error(self, ctx, error):
+        self.sent_at.pop(ctx.message.id, None)
+        self.errors += 1
+        if self.first_error is None:
+            self.first_error = error
+
+
+async def watch_lag(samples, interval=0.01):
+    """Record how late the loop wakes up a task that asked to sleep `interval`"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - start - interval)
+
+
+async def send_traffic(bot, guild, channels, args):
+    rng = random.Random(args.seed)
+    texts, weights = list(MIX), list(MIX.values())
+    sent = 0
+    started = time.perf_counter()
+    deadline = started + args.duration
+    while True:
+        current = time.perf_counter()
+        if current >= deadline:
+            break
+        due = args.batch if not args.rate else int((current - started) * args.rate) - sent
+        for _ in range(due):
+            content = rng.choices(texts, weights)[0]
+            message = FakeMessage(
+                guild.members[rng.randrange(len(guild.members))],
+                channels[rng.randrange(len(channels))],
+                content,
+                message_id=sent
+            )
+            if content.startswith("!"):
+                bot.sent_at[sent] = time.perf_counter()
+            bot.dispatch("message", message)
+            sent += 1
+        # Let the handlers run; the gateway would be reading the next frame here
+        await asyncio.sleep(0.001 if args.rate else 0)
+    return sent, time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=1000, help="messages per second, 0 for flat out")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of traffic")
+    parser.add_argument("--users", type=int, default=10_000, help="members in the guild")
+    parser.add_argument("--channels", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=100, help="messages per loop turn with --rate 0")
+    parser.add_argument("--durable", action="store_true", help="journal and fsync every commit")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    store, workdir = make_store(durable=args.durable)
+    try:
+        guild = FakeGuild()
+        seed_economy(store, guild, args.users, seed=args.seed)
+        channels = [FakeChannel(channel_id, guild) for channel_id in range(1, args.channels + 1)]
+        bot = await make_bot(store, bot_class=GatewayBot)
+        # Entering the client sets up its loop, as logging in would
+        async with bot:
+            await run(bot, store, guild, channels, args)
+    finally:
+        workdir.cleanup()
+
+
+async def run(bot, store, guild, channels, args):
+    store.start()
+    # Build the boards before the clock starts, as a running bot would have
+    await bot.rankings.build(guild)
+
+    lag = []
+    watcher = asyncio.create_task(watch_lag(lag))
+    sent, elapsed = await send_traffic(bot, guild, channels, args)
+
+    # Drain: wait for the handlers still queued behind the last message
+    drain = time.perf_counter()
+    while any(task.get_name().startswith("discord.py:") for task in asyncio.all_tasks()):
+        await asyncio.sleep(0.005)
+    drain = time.perf_counter() - drain
+    watcher.cancel()
+
+    commands_run = len(bot.latencies)
+    latencies = [value * 1000 for value in bot.latencies] or [0.0]
+    lag = [value * 1000 for value in lag] or [0.0]
+    print(f"{args.users:,} users, {args.channels} channels, target {args.rate or 'max'} msg/s for {args.duration}s")
+    print(f"sent        {sent:,} messages in {elapsed:.2f}s ({sent / elapsed:,.0f} msg/s), drained in {drain:.2f}s")
+    print(f"sustained   {sent / (elapsed + drain):,.0f} msg/s")
+    print(f"commands    {commands_run:,} ok, {bot.errors} failed")
+    print(f"latency ms  p50 {percentile(latencies, 0.5):.2f}  p99 {percentile(latencies, 0.99):.2f}  max {max(latencies):.2f}")
+    print(f"loop lag ms p50 {percentile(lag, 0.5):.2f}  p99 {percentile(lag, 0.99):.2f}  max {max(lag):.2f}")
+    if bot.first_error is not None:
+        print(f"first error: {bot.first_error!r}")
+
+    for name in list(bot.extensions):
+        await bot.unload_extension(name)
+    store.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
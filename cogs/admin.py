@@ -1,3 +1,4 @@
+import gc
 import io
 import textwrap
 import traceback
@@ -5,11 +6,17 @@ from contextlib import redirect_stdout
 import discord
 from discord.ext import commands
 import json
+import time
+import tracemalloc
+from utils.metrics import Histogram
+from utils.profiling import cpu_profile, format_bytes, record_footprint, rss_bytes, sample_profile, type_counts
 
 class Admin(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self._last_result = None
+        self._profiling = False
+        self._snapshots = []  # tracemalloc snapshots: the first one, then the latest two
 
     def cleanup_code(self, content):
         if content.startswith('```') and content.endswith('```'):
@@ -64,5 +71,217 @@ class Admin(commands.Cog):
                 self._last_result = ret
                 await ctx.send(f'```py\n{value}{ret}\n```')
 
+    # ---------- Profiling ----------
+    @commands.is_owner()
+    @commands.group(hidden=True, invoke_without_command=True)
+    async def prof(self, ctx):
+        """Profile the live bot: !prof cpu [seconds] [top] [sort] / !prof sample [seconds] [interval ms]"""
+        await ctx.send_help(ctx.command)
+
+    @commands.is_owner()
+    @prof.command(name="cpu")
+    async def prof_cpu(self, ctx, seconds: float = 10, top: int = 40, sort: str = "cumulative"):
+        """cProfile the event loop for a window and upload the top functions"""
+        if sort not in ("cumulative", "tottime", "ncalls"):
+            return await ctx.send("Sort by `cumulative`, `tottime` or `ncalls`.")
+        report = await self._profile_window(ctx, seconds, cpu_profile(seconds, top, sort))
+        if report is not None:
+            await ctx.send(file=discord.File(fp=io.BytesIO(report.encode()), filename="cpu_profile.txt"))
+
+    @commands.is_owner()
+    @prof.command(name="sample")
+    async def prof_sample(self, ctx, seconds: float = 10, interval_ms: float = 5):
+        """Sample the event loop's stack for a window; uploads self time and collapsed stacks"""
+        sampler = await self._profile_window(ctx, seconds, sample_profile(seconds, interval_ms / 1000))
+        if sampler is not None:
+            await ctx.send(files=[
+                discord.File(fp=io.BytesIO(sampler.top().encode()), filename="sample_top.txt"),
+                # flamegraph.pl stacks.folded > flame.svg, or drop it on speedscope.app
+                discord.File(fp=io.BytesIO(sampler.collapsed().encode()), filename="stacks.folded")
+            ])
+
+    async def _profile_window(self, ctx, seconds, profile):
+        # Only one profiler can hook the interpreter at a time
+        if self._profiling or not 0 < seconds <= 300:
+            profile.close()
+            await ctx.send("A profile is already running." if self._profiling else "Pick a window of up to 300 seconds.")
+            return None
+        self._profiling = True
+        await ctx.send(f"Profiling for {seconds:g}s...")
+        try:
+            return await profile
+        finally:
+            self._profiling = False
+
+    # ---------- Memory ----------
+    @commands.is_owner()
+    @commands.group(hidden=True, invoke_without_command=True)
+    async def mem(self, ctx):
+        """Where the memory goes: RSS next to the sizes of the bot's own caches and the discord.py cache"""
+        bot = self.bot
+        e = discord.Embed(title="Memory", color=discord.Colour.dark_teal())
+        lines = [f"RSS: {format_bytes(rss_bytes())}"]
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            lines.append(f"Traced: {format_bytes(current)} (peak {format_bytes(peak)})")
+        lines.append(f"GC pending: {' / '.join(map(str, gc.get_count()))}")
+        e.add_field(name="Process", value="\n".join(lines), inline=False)
+
+        store = bot.store
+        e.add_field(name="Store", value=(
+            f"Users: {len(store.data):,} (~{format_bytes(record_footprint(store.data))})\n"
+            f"Dirty: {len(store.dirty):,}\n"
+            f"Locks: {len(store._locks):,}"
+        ))
+
+        rankings = bot.rankings
+        entries = sum(len(board) for boards in rankings.boards.values() for board in boards.values())
+        e.add_field(name="Rankings", value=(
+            f"Guilds: {len(rankings.boards):,}\n"
+            f"Board entries: {entries:,}\n"
+            f"Rob pools: {sum(len(pool.items) for pool in rankings.pools.values()):,}\n"
+            f"Users indexed: {len(rankings.guilds_of):,}"
+        ))
+        e.add_field(name="Sessions", value=(
+            f"Open: {len(bot.sessions.sessions):,}\n"
+            f"Timeout tasks: {len(bot.sessions.tasks):,}"
+        ))
+
+        user = bot.get_cog("User")
+        if user is not None:
+            avatar_bytes = sum(len(entry.pixels) for entry in user.avatars.entries.values())
+            e.add_field(name="Cards", value=(
+                f"Card cache: {len(user.card_cache.entries):,} ({format_bytes(user.card_cache.size)})\n"
+                f"Avatars: {len(user.avatars.entries):,} ({format_bytes(avatar_bytes)})\n"
+                f"Backgrounds: {len(user.catalog):,}\n"
+                f"XP cooldowns: {len(user.next_xp):,}"
+            ))
+
+        e.add_field(name="discord.py cache", value=(
+            f"Guilds: {len(bot.guilds):,}\n"
+            f"Members: {sum(len(guild.members) for guild in bot.guilds):,}\n"
+            f"Users: {len(bot.users):,}\n"
+            f"Messages: {len(bot.cached_messages):,}"
+        ))
+        await ctx.send(embed=e)
+
+    @commands.is_owner()
+    @mem.command(name="types")
+    async def mem_types(self, ctx, top: int = 25):
+        """Most common object types the garbage collector tracks (walks the whole heap)"""
+        lines = [f"{count:>12,}  {name}" for name, count in type_counts(top)]
+        await ctx.send("```\n" + "\n".join(lines) + "\n```")
+
+    @commands.is_owner()
+    @mem.command(name="start")
+    async def mem_start(self, ctx, frames: int = 1):
+        """Start tracing allocations; more frames give fuller tracebacks but cost more"""
+        if tracemalloc.is_tracing():
+            return await ctx.send("Already tracing.")
+        # Tracing slows every allocation down and grows with what it traces, so it is off until asked for
+        frames = max(1, min(frames, 25))
+        tracemalloc.start(frames)
+        self._snapshots = []
+        await ctx.send(f"Tracing allocations with {frames} frame(s). Take a baseline with `!mem snap`.")
+
+    @commands.is_owner()
+    @mem.command(name="stop")
+    async def mem_stop(self, ctx):
+        """Stop tracing and drop the snapshots"""
+        tracemalloc.stop()
+        self._snapshots = []
+        await ctx.send("Stopped tracing.")
+
+    @commands.is_owner()
+    @mem.command(name="snap")
+    async def mem_snap(self, ctx):
+        """Take a snapshot of what is allocated now; the first one stays as the baseline"""
+        if not tracemalloc.is_tracing():
+            return await ctx.send("Not tracing, start with `!mem start`.")
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>")
+        ))
+        self._snapshots.append(snapshot)
+        if len(self._snapshots) > 3:
+            del self._snapshots[1]
+        total = sum(stat.size for stat in snapshot.statistics("filename"))
+        await ctx.send(f"Snapshot {len(self._snapshots)} taken, {format_bytes(total)} traced.")
+
+    @commands.is_owner()
+    @mem.command(name="top")
+    async def mem_top(self, ctx, count: int = 25, group: str = "lineno"):
+        """Biggest allocation sites in the latest snapshot, by `lineno`, `filename` or `traceback`"""
+        if group not in ("lineno", "filename", "traceback"):
+            return await ctx.send("Group by `lineno`, `filename` or `traceback`.")
+        if not self._snapshots:
+            return await ctx.send("No snapshots yet, take one with `!mem snap`.")
+        stats = self._snapshots[-1].statistics(group)
+        await self._send_allocations(ctx, stats[:count], "mem_top.txt")
+
+    @commands.is_owner()
+    @mem.command(name="diff")
+    async def mem_diff(self, ctx, count: int = 25, against: str = "first"):
+        """What grew between a snapshot (`first` or `previous`) and the latest one"""
+        if len(self._snapshots) < 2:
+            return await ctx.send("Take at least two snapshots with `!mem snap`.")
+        if against not in ("first", "previous"):
+            return await ctx.send("Compare against `first` or `previous`.")
+        old = self._snapshots[0] if against == "first" else self._snapshots[-2]
+        stats = self._snapshots[-1].compare_to(old, "lineno")
+        await self._send_allocations(ctx, stats[:count], "mem_diff.txt")
+
+    async def _send_allocations(self, ctx, stats, filename):
+        report = "\n".join(
+            "\n".join([str(stat)] + [f"    {line}" for line in stat.traceback.format()[2:]])
+            for stat in stats
+        )
+        if len(report) < 1900:
+            await ctx.send(f"```\n{report or 'Nothing allocated'}\n```")
+        else:
+            await ctx.send(file=discord.File(fp=io.BytesIO(report.encode()), filename=filename))
+
+    @commands.is_owner()
+    @commands.command(hidden=True)
+    async def stats(self, ctx, export: str = None):
+        """Command latency, errors and storage I/O; `!stats prom` uploads the Prometheus text"""
+        metrics = self.bot.metrics
+        if export == "prom":
+            data = io.BytesIO(metrics.prometheus().encode())
+            await ctx.send(file=discord.File(fp=data, filename="metrics.prom"))
+            return
+
+        uptime = int(time.time() - metrics.started)
+        e = discord.Embed(title="Bot stats", color=discord.Colour.dark_teal())
+        e.description = f"Up {uptime // 3600}h {uptime % 3600 // 60}m"
+
+        # Busiest commands first
+        busiest = sorted(metrics.commands.items(), key=lambda item: item[1].count, reverse=True)
+        lines = [
+            f"`{name}` {h.count}× · p50 {h.quantile(0.5) * 1000:.1f} ms · p99 {h.quantile(0.99) * 1000:.1f} ms"
+            + (f" · **{metrics.errors[name]} errors**" if metrics.errors.get(name) else "")
+            for name, h in busiest[:15]
+        ]
+        for name, h in metrics.listeners.items():
+            errors = metrics.listener_errors.get(name)
+            lines.append(
+                f"`{name}` {h.count}× · p50 {h.quantile(0.5) * 1000:.1f} ms · p99 {h.quantile(0.99) * 1000:.1f} ms"
+                + (f" · **{errors} errors**" if errors else "")
+            )
+        e.add_field(name="Latency", value="\n".join(lines) or "Nothing yet", inline=False)
+
+        for source, values in metrics.read_sources().items():
+            lines = []
+            for stat, value in values.items():
+                if isinstance(value, Histogram):
+                    value = f"{value.count}× · mean {value.mean * 1000:.1f} ms · p99 {value.quantile(0.99) * 1000:.1f} ms"
+                elif isinstance(value, float):
+                    value = f"{value:.3f}"
+                lines.append(f"{stat}: {value}")
+            e.add_field(name=source, value="\n".join(lines) or "-", inline=True)
+
+        await ctx.send(embed=e)
+
 async def setup(bot):
     await bot.add_cog(Admin(bot))
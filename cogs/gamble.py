@@ -1,198 +1,223 @@
 import discord
 from discord.ext import commands
-import random
-import json
-import os
 from datetime import datetime
-
-dfile = "data.json"
+from utils.games import (
+    COIN_SIDES, Blackjack, coinflip_net, dice_net, flip_coin, load_game,
+    roll_dice, running_game, slots_net, spin_slots, store_game
+)
+from utils.records import now
 
 class Gambling(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.store = bot.store
+        self.sessions = bot.sessions
+        self.sessions.register(Blackjack.kind, self.blackjack_action, self.blackjack_timeout)
+
+    async def cog_load(self):
+        self.resume_games()
 
-    # ---------- Helper Functions ----------
-    def load_data(self):
-        if os.path.getsize(dfile) == 0:
-            with open(dfile,"w") as f:
-                json.dump({},f)
-            return {}
-        with open(dfile, "r") as f:
-            return json.load(f)
-
-    def save_data(self, data):
-        with open(dfile, "w") as f:
-            json.dump(data, f, indent=4)
-
-    def get_user(self, data, user_id):
-        user_id = str(user_id)
-        if user_id not in data:
-            data[user_id] = {
-                "money": 0,
-                "work": "1970-01-01 00:00:00",
-                "daily": "1970-01-01 00:00:00",
-                "weekly": "1970-01-01 00:00:00",
-                "rob": "1970-01-01 00:00:00"
-            }
-        return data[user_id]
+    async def cog_unload(self):
+        # The games stay on the records; loading the cog again resumes them
+        self.sessions.unregister(Blackjack.kind)
 
     # ---------- Gambling Commands ----------
 
     @commands.command(aliases=["cf"])
     async def coinflip(self, ctx, choice: str, bet: int):
         """Flip a coin. Choice: heads/tails"""
-        data = self.load_data()
-        user = self.get_user(data, ctx.author.id)
-
-        if bet > user["money"]:
-            await ctx.send("You don't have enough coins!")
-            return
-
         choice = choice.lower()
-        if choice not in ["heads", "tails"]:
+        if choice not in COIN_SIDES:
             await ctx.send("Choose either 'heads' or 'tails'.")
             return
+        if bet <= 0:
+            await ctx.send("Bet at least 1 coin.")
+            return
 
-        result = random.choice(["heads", "tails"])
-        if result == choice:
-            user["money"] += bet
-            await ctx.send(f"You won! The coin landed on **{result}**. You gained {bet} coins!")
-        else:
-            user["money"] -= bet
-            await ctx.send(f"You lost! The coin landed on **{result}**. You lost {bet} coins!")
+        async with self.store.user(ctx.author.id) as user:
+            if bet > user.money:
+                reply = "You don't have enough coins!"
+            else:
+                result = flip_coin()
+                net = coinflip_net(choice, result, bet)
+                user.money += net
+                if net > 0:
+                    reply = f"You won! The coin landed on **{result}**. You gained {bet} coins!"
+                else:
+                    reply = f"You lost! The coin landed on **{result}**. You lost {bet} coins!"
 
-        self.save_data(data)
+        await ctx.send(reply)
 
     @commands.command()
     async def slots(self, ctx, bet: int):
         """Play a simple 3-symbol slot machine"""
-        data = self.load_data()
-        user = self.get_user(data, ctx.author.id)
+        if bet <= 0:
+            await ctx.send("Bet at least 1 coin.")
+            return
+
+        async with self.store.user(ctx.author.id) as user:
+            if bet > user.money:
+                result = None
+            else:
+                result = spin_slots()
+                net, win = slots_net(result, bet)
+                user.money += net
+                if win == "jackpot":
+                    reply = f"Jackpot! You won {net} coins!"
+                elif win == "pair":
+                    reply = f"Two in a row! You won {net} coins!"
+                else:
+                    reply = f"No match! You lost {bet} coins."
 
-        if bet > user["money"]:
+        if result is None:
             await ctx.send("You don't have enough coins!")
             return
 
-        symbols = ["🍒","🍋","🔔","⭐","💎"]
-        result = [random.choice(symbols) for _ in range(3)]
-
         await ctx.send(" | ".join(result))
-
-        # Check win conditions
-        if result[0] == result[1] == result[2]:
-            winnings = bet * 5
-            user["money"] += winnings
-            await ctx.send(f"Jackpot! You won {winnings} coins!")
-        elif result[0] == result[1] or result[1] == result[2] or result[0] == result[2]:
-            winnings = bet * 2
-            user["money"] += winnings
-            await ctx.send(f"Two in a row! You won {winnings} coins!")
-        else:
-            user["money"] -= bet
-            await ctx.send(f"No match! You lost {bet} coins.")
-
-        self.save_data(data)
+        await ctx.send(reply)
 
     @commands.command()
     async def dice(self, ctx, bet: int):
         """Roll 3d6 against the bot"""
-        data = self.load_data()
-        user = self.get_user(data, ctx.author.id)
-
-        if bet > user["money"]:
-            await ctx.send("You don't have enough coins!")
+        if bet <= 0:
+            await ctx.send("Bet at least 1 coin.")
             return
 
-        user_rolls = [random.randint(1,6) for _ in range(3)]
-        bot_rolls = [random.randint(1,6) for _ in range(3)]
+        async with self.store.user(ctx.author.id) as user:
+            if bet > user.money:
+                rolls = None
+            else:
+                user_rolls = roll_dice()
+                bot_rolls = roll_dice()
+                rolls = (user_rolls, bot_rolls)
+
+                user_total = sum(user_rolls)
+                bot_total = sum(bot_rolls)
+
+                net = dice_net(user_total, bot_total, bet)
+                user.money += net
+                if net > 0:
+                    reply = f"You win! You gained {bet} coins."
+                elif net < 0:
+                    reply = f"You lose! You lost {bet} coins."
+                else:
+                    reply = "It's a tie! No coins lost or gained."
 
-        user_total = sum(user_rolls)
-        bot_total = sum(bot_rolls)
+        if rolls is None:
+            await ctx.send("You don't have enough coins!")
+            return
 
         await ctx.send(f"You rolled: {user_rolls} (Total: {user_total})\nBot rolled: {bot_rolls} (Total: {bot_total})")
-
-        if user_total > bot_total:
-            user["money"] += bet
-            await ctx.send(f"You win! You gained {bet} coins.")
-        elif user_total < bot_total:
-            user["money"] -= bet
-            await ctx.send(f"You lose! You lost {bet} coins.")
-        else:
-            await ctx.send("It's a tie! No coins lost or gained.")
-
-        self.save_data(data)
+        await ctx.send(reply)
 
     @commands.command(aliases=["bj"])
     async def blackjack(self, ctx, bet: int):
         """Play an interactive blackjack against the bot"""
-        data = self.load_data()
-        user = self.get_user(data, ctx.author.id)
-
-        if bet > user["money"]:
-            await ctx.send("You don't have enough coins!")
+        if bet <= 0:
+            await ctx.send("Bet at least 1 coin.")
             return
 
-        def draw_card():
-            return random.randint(1, 11)
-
-        user_cards = [draw_card(), draw_card()]
-        bot_cards = [draw_card(), draw_card()]
+        # Reserve the bet and start the game in one transaction, so the game
+        # never works from a stale balance and the bet is never lost track of
+        async with self.store.user(ctx.author.id) as user:
+            if running_game(user, ctx.channel.id) is not None:
+                game = None
+                reply = "You already have a game running here!"
+            elif bet > user.money:
+                game = None
+                reply = "You don't have enough coins!"
+            else:
+                user.money -= bet
+                game = Blackjack(bet)
+                store_game(user, ctx.channel.id, game)
+
+        if game is None:
+            await ctx.send(reply)
+            return
 
-        user_total = sum(user_cards)
-        bot_total = sum(bot_cards)
+        # Open the session before talking to Discord: if the send fails, the game
+        # still times out and settles instead of holding the bet forever
+        if not game.finished:
+            self.sessions.open(ctx.channel.id, ctx.author.id, game.kind, game.moves, game.timeout)
 
         # Send initial hand
-        msg = await ctx.send(
-            f"Your cards: {user_cards} (Total: {user_total})\n"
-            f"Bot shows: [{bot_cards[0]}, ?]\n"
+        await ctx.send(
+            f"Your cards: {game.player} (Total: {game.player_total})\n"
+            f"Bot shows: [{game.dealer[0]}, ?]\n"
             "Type `hit` to draw another card or `stand` to hold."
         )
 
-        # Interactive loop
-        while user_total < 21:
-            try:
-                response = await self.bot.wait_for(
-                    "message",
-                    check=lambda m: m.author == ctx.author and m.channel == ctx.channel and m.content.lower() in ["hit", "stand"],
-                    timeout=30.0  # 30 seconds to respond
-                )
-            except asyncio.TimeoutError:
-                await ctx.send("Time's up! You automatically stand.")
-                break
-
-            if response.content.lower() == "hit":
-                card = draw_card()
-                user_cards.append(card)
-                user_total = sum(user_cards)
-                if user_total > 21:
-                    await ctx.send(f"You drew {card}. Your total is {user_total} — busted!")
-                    user["money"] -= bet
-                    self.save_data(data)
-                    return
-                else:
-                    await ctx.send(f"You drew {card}. Your total is now {user_total}. Type `hit` or `stand`.")
-            else:  # stand
-                await ctx.send(f"You stand with {user_total}.")
-                break
-
-        # Bot's turn (hit until 17 or higher)
-        while bot_total < 17:
-            bot_cards.append(draw_card())
-            bot_total = sum(bot_cards)
-
-        await ctx.send(f"Bot's cards: {bot_cards} (Total: {bot_total})")
-
-        # Determine winner
-        if bot_total > 21 or user_total > bot_total:
-            user["money"] += bet
-            await ctx.send(f"You win! You gained {bet} coins.")
-        elif user_total < bot_total:
-            user["money"] -= bet
-            await ctx.send(f"You lose! You lost {bet} coins.")
+        if game.finished:
+            await self.blackjack_summary(ctx.channel, game)
+
+    async def blackjack_action(self, session, channel, word):
+        async with self.store.user(session.user_id) as user:
+            game = running_game(user, session.channel_id)
+            # Gone already if the game timed out while this move waited for the lock
+            if game is not None:
+                game.touch()
+                if word == "hit":
+                    card = game.hit()
+                    if game.result == "bust":
+                        # The bet was already taken, nothing to pay out
+                        reply = f"You drew {card}. Your total is {game.player_total} — busted!"
+                    elif game.finished:
+                        reply = f"You drew {card}. Your total is now {game.player_total}."
+                    else:
+                        reply = f"You drew {card}. Your total is now {game.player_total}. Type `hit` or `stand`."
+                else:  # stand
+                    game.stand()
+                    reply = f"You stand with {game.player_total}."
+                store_game(user, session.channel_id, game)
+
+        if game is None:
+            self.sessions.close(session)
+            return
+        if game.finished:
+            self.sessions.close(session)
+        await channel.send(reply)
+        if game.finished:
+            await self.blackjack_summary(channel, game)
+
+    async def blackjack_timeout(self, session, channel):
+        async with self.store.user(session.user_id) as user:
+            game = running_game(user, session.channel_id)
+            if game is not None:
+                game.stand()
+                store_game(user, session.channel_id, game)
+
+        # The channel may be gone by the time a game times out; the payout still counts
+        if game is None or channel is None:
+            return
+        await channel.send("Time's up! You automatically stand.")
+        await self.blackjack_summary(channel, game)
+
+    async def blackjack_summary(self, channel, game):
+        if game.result == "bust":
+            return
+        await channel.send(f"Bot's cards: {game.dealer} (Total: {game.dealer_total})")
+        if game.result == "win":
+            await channel.send(f"You win! You gained {game.bet} coins.")
+        elif game.result == "lose":
+            await channel.send(f"You lose! You lost {game.bet} coins.")
         else:
-            await ctx.send("It's a tie! No coins lost or gained.")
+            await channel.send("It's a tie! No coins lost or gained.")
+
+    # ---------- Sessions ----------
+    def resume_games(self):
+        """Route replies to games left running by a restart or an earlier load of this cog"""
+        current = now()
+        for user_id, record in self.store.data.items():
+            if not record.games:
+                continue
+            for channel_id, data in record.games.items():
+                if self.sessions.get(int(channel_id), int(user_id)) is not None:
+                    continue
+                game = load_game(data)
+                session = self.sessions.open(int(channel_id), int(user_id), game.kind, game.moves, game.timeout)
+                # Games that ran out while the bot was down get a few seconds to settle
+                self.sessions.touch(session, max(game.expires - current, 5))
 
-        self.save_data(data)
 
 async def setup(bot):
     await bot.add_cog(Gambling(bot))
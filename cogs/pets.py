@@ -1,69 +1,24 @@
 import discord
 from discord.ext import commands
-import json
 import os
 import random
-from datetime import datetime, timedelta
+from utils.records import now
 
-dfile = "data.json"  # Same as your economy system
 TOKEN = os.getenv("DISCORD_TOKEN")
 
 class Pets(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.store = bot.store
 
-    # ---------- Data Handling ----------
-    def load_data(self):
-        if os.path.getsize(dfile) == 0:
-            with open(dfile, "w") as f:
-                json.dump({}, f)
-            return {}
-        with open(dfile, "r") as f:
-            return json.load(f)
-
-    def save_data(self, data):
-        with open(dfile, "w") as f:
-            json.dump(data, f, indent=4)
-
-    def get_user(self, data, user_id):
-        user_id = str(user_id)
-        if user_id not in data:
-            data[user_id] = {
-                "money": 0,
-                "work": "1970-01-01 00:00:00",
-                "daily": "1970-01-01 00:00:00",
-                "weekly": "1970-01-01 00:00:00",
-                "rob": "1970-01-01 00:00:00",
-                "fish": "1970-01-01 00:00:00",
-                "pet": None,  # store type: bird/cat/dog
-                "pet_name": None,
-                "last_play": "1970-01-01 00:00:00",
-                "last_feed": "1970-01-01 00:00:00",
-                "last_bathe": "1970-01-01 00:00:00"
-            }
-        else:
-            # Make sure pet keys exist for old users
-            for key in ["pet", "pet_name", "last_play", "last_feed", "last_bathe"]:
-                if key not in data[user_id]:
-                    if key.startswith("last_"):
-                        data[user_id][key] = "1970-01-01 00:00:00"
-                    else:
-                        data[user_id][key] = None
-
-        return data[user_id]
-
-    # ---------- Cooldown helpers ----------
-    def can_claim(self, last_time, cooldown):
-        last = datetime.strptime(last_time, "%Y-%m-%d %H:%M:%S")
-        return datetime.utcnow() >= last + timedelta(seconds=cooldown)
-
-    def remaining(self, last_time, cooldown):
-        last = datetime.strptime(last_time, "%Y-%m-%d %H:%M:%S")
-        remaining_time = (last + timedelta(seconds=cooldown)) - datetime.utcnow()
-        total_seconds = int(remaining_time.total_seconds())
-        hours, remainder = divmod(total_seconds, 3600)
-        minutes, _ = divmod(remainder, 60)
-        return f"{hours}h {minutes}m"
+        # ---------- Cooldowns ----------
+        cooldowns = bot.cooldowns
+        self.play_cd = cooldowns.register("Pet play", "last_play", 10 * 60, order=60)  # 10 minutes
+        self.feed_cd = cooldowns.register("Pet feed", "last_feed", 2 * 3600, order=70)  # 2 hours
+        self.bathe_cd = cooldowns.register("Pet bathe", "last_bathe", 3 * 3600, order=80)  # 3 hours
+
+    async def cog_unload(self):
+        self.bot.cooldowns.unregister(self.play_cd, self.feed_cd, self.bathe_cd)
 
     # ---------- Commands ----------
     @commands.command()
@@ -95,109 +50,83 @@ class Pets(commands.Cog):
             await ctx.send("You can only adopt a bird, cat, or dog.")
             return
 
-        data = self.load_data()
-        user = self.get_user(data, ctx.author.id)
-
-        if user["pet"] is not None:
-            await ctx.send(f"You already have a pet: **{user['pet_name']}** the {user['pet']}.")
-            return
+        async with self.store.user(ctx.author.id) as user:
+            if user.pet is not None:
+                reply = f"You already have a pet: **{user.pet_name}** the {user.pet}."
+            else:
+                user.pet = pet_type
+                user.pet_name = pet_name
+                reply = f"🎉 You adopted a **{pet_type}** named **{pet_name}**!"
 
-        user["pet"] = pet_type
-        user["pet_name"] = pet_name
-        self.save_data(data)
-        await ctx.send(f"🎉 You adopted a **{pet_type}** named **{pet_name}**!")
+        await ctx.send(reply)
 
     @commands.command()
     async def feed(self, ctx):
         """Feed your pet (2h cooldown)"""
-        data = self.load_data()
-        user = self.get_user(data, ctx.author.id)
-
-        if user["pet"] is None:
-            await ctx.send("You don't have a pet yet! Adopt one with `!adopt <pet> <name>`")
-            return
-
-        cooldown = 2 * 3600  # 2 hours
-        if not self.can_claim(user["last_feed"], cooldown):
-            await ctx.send(f"You must wait {self.remaining(user['last_feed'], cooldown)} before feeding again.")
-            return
-
-        coins = random.randint(20, 50)
-        user["money"] += coins
-        user["last_feed"] = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-        self.save_data(data)
-
-        await ctx.send(f"🍖 You fed **{user['pet_name']}** and earned **{coins} coins**!")
+        async with self.store.user(ctx.author.id) as user:
+            if user.pet is None:
+                reply = "You don't have a pet yet! Adopt one with `!adopt <pet> <name>`"
+            elif not self.feed_cd.ready(user):
+                reply = f"You must wait {self.feed_cd.remaining(user)} before feeding again."
+            else:
+                coins = random.randint(20, 50)
+                user.money += coins
+                user.last_feed = now()
+                reply = f"🍖 You fed **{user.pet_name}** and earned **{coins} coins**!"
+
+        await ctx.send(reply)
 
     @commands.command()
     async def bathe(self, ctx):
         """Bathe your pet (3h cooldown)"""
-        data = self.load_data()
-        user = self.get_user(data, ctx.author.id)
-
-        if user["pet"] is None:
-            await ctx.send("You don't have a pet yet! Adopt one with `!adopt <pet> <name>`")
-            return
-
-        cooldown = 3 * 3600  # 3 hours
-        if not self.can_claim(user["last_bathe"], cooldown):
-            await ctx.send(f"You must wait {self.remaining(user['last_bathe'], cooldown)} before bathing again.")
-            return
-
-        coins = random.randint(30, 70)
-        user["money"] += coins
-        user["last_bathe"] = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-        self.save_data(data)
-
-        await ctx.send(f"🛁 You bathed **{user['pet_name']}** and earned **{coins} coins**!")
+        async with self.store.user(ctx.author.id) as user:
+            if user.pet is None:
+                reply = "You don't have a pet yet! Adopt one with `!adopt <pet> <name>`"
+            elif not self.bathe_cd.ready(user):
+                reply = f"You must wait {self.bathe_cd.remaining(user)} before bathing again."
+            else:
+                coins = random.randint(30, 70)
+                user.money += coins
+                user.last_bathe = now()
+                reply = f"🛁 You bathed **{user.pet_name}** and earned **{coins} coins**!"
+
+        await ctx.send(reply)
 
     @commands.command()
     async def play(self, ctx):
         """Play with your pet (10min cooldown)"""
-        data = self.load_data()
-        user = self.get_user(data, ctx.author.id)
-
-        if user["pet"] is None:
-            await ctx.send("You don't have a pet yet! Adopt one with `!adopt <pet> <name>`")
-            return
-
-        cooldown = 10 * 60  # 10 minutes
-        if not self.can_claim(user["last_play"], cooldown):
-            await ctx.send(f"You must wait {self.remaining(user['last_play'], cooldown)} before playing again.")
-            return
-
-        coins = random.randint(15, 40)
-        user["money"] += coins
-        user["last_play"] = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-        self.save_data(data)
-
-        await ctx.send(f"🎾 You played with **{user['pet_name']}** and earned **{coins} coins**!")
+        async with self.store.user(ctx.author.id) as user:
+            if user.pet is None:
+                reply = "You don't have a pet yet! Adopt one with `!adopt <pet> <name>`"
+            elif not self.play_cd.ready(user):
+                reply = f"You must wait {self.play_cd.remaining(user)} before playing again."
+            else:
+                coins = random.randint(15, 40)
+                user.money += coins
+                user.last_play = now()
+                reply = f"🎾 You played with **{user.pet_name}** and earned **{coins} coins**!"
+
+        await ctx.send(reply)
 
     @commands.command()
     async def mypet(self, ctx):
         """View your pet and cooldowns"""
-        data = self.load_data()
-        user = self.get_user(data, ctx.author.id)
+        user = self.store.get_user(ctx.author.id)
 
-        if user["pet"] is None:
+        if user.pet is None:
             await ctx.send("You don't have a pet yet! Adopt one with `!adopt <pet> <name>`")
             return
 
-        # Cooldowns
-        play_cd = 10 * 60
-        feed_cd = 2 * 3600
-        bathe_cd = 3 * 3600
-
-        play_rem = "✅ Ready" if self.can_claim(user["last_play"], play_cd) else self.remaining(user["last_play"], play_cd)
-        feed_rem = "✅ Ready" if self.can_claim(user["last_feed"], feed_cd) else self.remaining(user["last_feed"], feed_cd)
-        bathe_rem = "✅ Ready" if self.can_claim(user["last_bathe"], bathe_cd) else self.remaining(user["last_bathe"], bathe_cd)
+        play_rem = "✅ Ready" if self.play_cd.ready(user) else self.play_cd.remaining(user)
+        feed_rem = "✅ Ready" if self.feed_cd.ready(user) else self.feed_cd.remaining(user)
+        bathe_rem = "✅ Ready" if self.bathe_cd.ready(user) else self.bathe_cd.remaining(user)
 
         embed = discord.Embed(
             title=f"{ctx.author.display_name}'s Pet",
             color=discord.Colour.green()
         )
-        embed.add_field(name="Name", value=user["pet_name"])
-        embed.add_field(name="Type", value=user["pet"])
+        embed.add_field(name="Name", value=user.pet_name)
+        embed.add_field(name="Type", value=user.pet)
         embed.add_field(name="Play cooldown", value=play_rem)
         embed.add_field(name="Feed cooldown", value=feed_rem)
         embed.add_field(name="Bathe cooldown", value=bathe_rem)
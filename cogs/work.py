@@ -2,182 +2,192 @@ import discord
 from discord.ext import commands
 import random
 import asyncio
-import json
-import os
-from datetime import datetime, timedelta
-
-dfile = "data.json"
+import typing
+from utils.records import now
 
 class Work(commands.Cog):
+    titles = {
+        "money": "Top Richest",
+        "level": "Top Levels"
+    }
+
     def __init__(self, bot):
         self.bot = bot
+        self.store = bot.store
 
-    # -----------DATA-----------
-    def load_data(self):
-        if os.path.getsize(dfile) == 0:
-            with open(dfile,"w") as f:
-                json.dump({},f)
-            return {}
-        with open(dfile, "r") as f:
-            return json.load(f)
-
-    def save_data(self, data):
-        with open(dfile, "w") as f:
-            json.dump(data, f, indent=4)
-
-    def get_user(self, data, user_id):
-        user_id = str(user_id)
-        if user_id not in data:
-            data[user_id] = {
-                "money": 0,
-                "work": "1970-01-01 00:00:00",
-                "daily": "1970-01-01 00:00:00",
-                "weekly": "1970-01-01 00:00:00",
-                "rob": "1970-01-01 00:00:00",
-                "fish": "1970-01-01 00:00:00"
-            }
-        return data[user_id]
-
-    def can_claim(self, last_time, cooldown):
-        last = datetime.strptime(last_time, "%Y-%m-%d %H:%M:%S")
-        return datetime.utcnow() >= last + timedelta(seconds=cooldown)
-
-    def remaining(self, last_time, cooldown, show_days=False):
-        last = datetime.strptime(last_time, "%Y-%m-%d %H:%M:%S")
-        remaining = (last + timedelta(seconds=cooldown)) - datetime.utcnow()
-        total_seconds = int(remaining.total_seconds())
-        if show_days:
-            days, remainder = divmod(total_seconds, 86400)
-            hours, remainder = divmod(remainder, 3600)
-            minutes, _ = divmod(remainder, 60)
-            return f"{days}d {hours}h {minutes}m"
-        else:
-            hours, remainder = divmod(total_seconds, 3600)
-            minutes, _ = divmod(remainder, 60)
-
-            return f"{hours}h {minutes}m"
+        # -----------COOLDOWNS-----------
+        cooldowns = bot.cooldowns
+        self.work_cd = cooldowns.register("Work", "work", 3600, order=10)
+        self.daily_cd = cooldowns.register("Daily", "daily", 86400, order=20)
+        self.weekly_cd = cooldowns.register("Weekly", "weekly", 604800, show_days=True, order=30)
+        self.rob_cd = cooldowns.register("Rob", "rob", 1800, order=40)
+
+    async def cog_unload(self):
+        self.bot.cooldowns.unregister(self.work_cd, self.daily_cd, self.weekly_cd, self.rob_cd)
 
     # -----------COMMANDS-----------
 
     @commands.command()
     async def work(self, ctx):
-        data = self.load_data()
-        user = self.get_user(data, ctx.author.id)
-
-        if not self.can_claim(user["work"], 3600):
-            await ctx.send(f"You must wait {self.remaining(user['work'], 3600)} before working again")
-            return
-
-        amount = random.randint(20,80)
-        user["money"] += amount
-        user["work"] = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        async with self.store.user(ctx.author.id) as user:
+            if not self.work_cd.ready(user):
+                reply = f"You must wait {self.work_cd.remaining(user)} before working again"
+            else:
+                amount = random.randint(20,80)
+                user.money += amount
+                user.work = now()
+                reply = f"You worked and earned **{amount} coins**"
 
-        self.save_data(data)
-        await ctx.send(f"You worked and earned **{amount} coins**")
+        await ctx.send(reply)
 
     @commands.command()
     async def daily(self, ctx):
-        data = self.load_data()
-        user = self.get_user(data, ctx.author.id)
-
-        if not self.can_claim(user["daily"], 86400):
-            await ctx.send(f"You already claimed daily. Wait {self.remaining(user['daily'], 86400)}")
-            return
-
-        amount = random.randint(150, 300)
-        user["money"] += amount
-        user["daily"] = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        async with self.store.user(ctx.author.id) as user:
+            if not self.daily_cd.ready(user):
+                reply = f"You already claimed daily. Wait {self.daily_cd.remaining(user)}"
+            else:
+                amount = random.randint(150, 300)
+                user.money += amount
+                user.daily = now()
+                reply = f"Daily reward: **{amount} coins**"
 
-        self.save_data(data)
-        await ctx.send(f"Daily reward: **{amount} coins**")
+        await ctx.send(reply)
 
     @commands.command()
     async def weekly(self, ctx):
-        data = self.load_data()
-        user = self.get_user(data, ctx.author.id)
-
-        if not self.can_claim(user["weekly"], 604800):
-            await ctx.send(f"You already claimed weekly. Wait {self.remaining(user['weekly'], 604800, show_days=True)}.")
-            return
-
-        amount = random.randint(800, 1500)
-        user["money"] += amount
-        user["weekly"] = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        async with self.store.user(ctx.author.id) as user:
+            if not self.weekly_cd.ready(user):
+                reply = f"You already claimed weekly. Wait {self.weekly_cd.remaining(user)}."
+            else:
+                amount = random.randint(800, 1500)
+                user.money += amount
+                user.weekly = now()
+                reply = f"Weekly reward: **{amount} coins**"
 
-        self.save_data(data)
-        await ctx.send(f"Weekly reward: **{amount} coins**")
+        await ctx.send(reply)
 
     @commands.command(aliases=["bal"])
     async def balance(self, ctx):
-        data = self.load_data()
-        user = self.get_user(data, ctx.author.id)
-        await ctx.send(f"You have **{user['money']} coins**")
+        user = self.store.get_user(ctx.author.id)
+        await ctx.send(f"You have **{user.money} coins**")
 
     @commands.command(aliases=["lb","top"])
-    async def leaderboard(self, ctx):
-        data = self.load_data()
-        guild_users = {
-            uid: info["money"]
-            for uid, info in data.items()
-            if ctx.guild.get_member(int(uid)) is not None
-        }
-
-        if not guild_users:
-            await ctx.send("No leaderboard data yet.")
+    async def leaderboard(self, ctx, page: typing.Optional[int] = 1, metric: str = "money"):
+        """Show the server ranking: !lb [page] [money|level]"""
+        metric = metric.lower()
+        if metric not in self.titles:
+            await ctx.send("Pick a leaderboard: `money` or `level`.")
             return
 
-        sorted_users = sorted(guild_users.items(), key=lambda x: x[1], reverse=True)
+        board = await self.bot.rankings.board(ctx.guild, metric)
+        if not len(board):
+            await ctx.send("No leaderboard data yet.")
+            return
 
-        top_10 = sorted_users[:10]
+        pages = (len(board) + 9) // 10
+        page = max(1, min(page, pages))
+        start = (page - 1) * 10
 
         e = discord.Embed(
-            title="Top 10 Richest",
+            title=self.titles[metric],
             color=discord.Colour.gold()
         )
         lines = []
         medals = ["🥇","🥈","🥉"]
 
-        for rank, (user_id, money) in enumerate(top_10, start=1):
+        for rank, (user_id, score) in enumerate(board.page(start, 10), start=start + 1):
             member = ctx.guild.get_member(int(user_id))
-            name = member.display_name if member else f"User {uid}"
+            name = member.display_name if member else f"User {user_id}"
 
             prefix = medals[rank-1] if rank <= 3 else f"#{rank}"
-            lines.append(f"{prefix} **{name}** - {money} coins")
+            if metric == "money":
+                lines.append(f"{prefix} **{name}** - {score} coins")
+            else:
+                level, xp = score
+                lines.append(f"{prefix} **{name}** - Level {level} ({xp} XP)")
         e.description = "\n".join(lines)
+        e.set_footer(text=f"Page {page}/{pages}")
         await ctx.send(embed=e)
 
+    @commands.command()
+    async def rank(self, ctx, member: discord.Member = None):
+        """Show where you (or someone else) stand on the server boards"""
+        if member is None:
+            member = ctx.author
+
+        e = discord.Embed(
+            title=f"{member.display_name}'s Rank",
+            color=discord.Colour.gold()
+        )
+
+        for metric, label in (("money", "Money"), ("level", "Level")):
+            board = await self.bot.rankings.board(ctx.guild, metric)
+            found = board.rank(str(member.id))
+            if found is None:
+                e.add_field(name=label, value="Not ranked yet", inline=False)
+                continue
+
+            position, score, above = found
+            value = f"#{position} of {len(board)}"
+            if above is None:
+                value += " - top of the server!"
+            else:
+                above_id, above_score = above
+                above_member = ctx.guild.get_member(int(above_id))
+                above_name = above_member.display_name if above_member else f"User {above_id}"
+                if metric == "money":
+                    gap = f"{above_score - score} coins"
+                elif above_score[0] == score[0]:
+                    gap = f"{above_score[1] - score[1]} XP"
+                else:
+                    gap = f"{above_score[0] - score[0]} levels"
+                value += f" - {gap} behind **{above_name}**"
+            e.add_field(name=label, value=value, inline=False)
+
+        await ctx.send(embed=e)
+
+    # Build the boards before anyone asks, instead of inside someone's !lb
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild):
+        await self.bot.rankings.build(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild):
+        await self.bot.rankings.build(guild)
+
+    # Keep the guild rankings in sync with the member list
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        self.bot.rankings.member_join(member)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        self.bot.rankings.member_remove(member)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.bot.rankings.guild_remove(guild)
+
     @commands.command()
     async def rob(self, ctx, target: discord.Member = None):
-        data = self.load_data()
-        robber = self.get_user(data, ctx.author.id)
+        robber = self.store.get_user(ctx.author.id)
 
         # ---------- Cooldown check (30 min = 1800 sec) ----------
-        if not self.can_claim(robber["rob"], 1800):
+        if not self.rob_cd.ready(robber):
             await ctx.send(
-                f"You must wait {self.remaining(robber['rob'], 1800)} before robbing again."
+                f"You must wait {self.rob_cd.remaining(robber)} before robbing again."
             )
             return
 
         # ---------- Pick random target ----------
         if target is None:
-            possible_targets = []
-
-            for uid, info in data.items():
-                member = ctx.guild.get_member(int(uid))
-                if (
-                    member is not None
-                    and member != ctx.author
-                    and not member.bot
-                    and info["money"] > 0
-                ):
-                    possible_targets.append(member)
-
-            if not possible_targets:
+            target_id = await self.bot.rankings.rob_target(ctx.guild, exclude=str(ctx.author.id))
+            target = ctx.guild.get_member(int(target_id)) if target_id is not None else None
+
+            if target is None:
                 await ctx.send("No one to rob")
                 return
 
-            target = random.choice(possible_targets)
-
         # ---------- Checks ----------
         if target == ctx.author:
             await ctx.send("You can't rob yourself")
@@ -187,66 +197,44 @@ class Work(commands.Cog):
             await ctx.send("You can't rob bots")
             return
 
-        victim = self.get_user(data, target.id)
-
-        if victim["money"] <= 0:
-            await ctx.send(f"{target.display_name} has no money.")
-            return
-
-        # ---------- Set cooldown time ----------
-        robber["rob"] = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-
-        # ---------- 70% success ----------
-        if random.random() < 0.7:
-            percent = random.uniform(0.1, 0.4)
-            amount = max(1, int(victim["money"] * percent))
-
-            victim["money"] -= amount
-            robber["money"] += amount
+        async with self.store.users(ctx.author.id, target.id) as (robber, victim):
+            # Re-check inside the lock, another command may have run meanwhile
+            if not self.rob_cd.ready(robber):
+                reply = f"You must wait {self.rob_cd.remaining(robber)} before robbing again."
+            elif victim.money <= 0:
+                reply = f"{target.display_name} has no money."
+            else:
+                # ---------- Set cooldown time ----------
+                robber.rob = now()
 
-            self.save_data(data)
+                # ---------- 70% success ----------
+                if random.random() < 0.7:
+                    percent = random.uniform(0.1, 0.4)
+                    amount = max(1, int(victim.money * percent))
 
-            await ctx.send(
-                f"You robbed **{target.display_name}** and stole **{amount} coins**!"
-            )
-
-        else:
-            fine = random.randint(5, 25)
-            robber["money"] = max(0, robber["money"] - fine)
+                    victim.money -= amount
+                    robber.money += amount
+                    reply = f"You robbed **{target.display_name}** and stole **{amount} coins**!"
+                else:
+                    fine = random.randint(5, 25)
+                    robber.money = max(0, robber.money - fine)
+                    reply = f"You got caught and paid **{fine} coins** in fines."
 
-            self.save_data(data)
+        await ctx.send(reply)
 
-            await ctx.send(
-                f"You got caught and paid **{fine} coins** in fines."
-            )
     @commands.command()
     async def cd(self, ctx):
-        data = self.load_data()
-        user = self.get_user(data, ctx.author.id)
-
-        commands_cd = {
-            "Work": ("work", 3600),
-            "Daily": ("daily", 86400),
-            "Weekly": ("weekly", 604800),
-            "Rob": ("rob", 1800),
-            "Fish": ("fish", 1200)
-        }
+        user = self.store.get_user(ctx.author.id)
 
         embed = discord.Embed(
             title="⏳ Your Cooldowns",
             color=discord.Colour.blue()
         )
 
-        for name, (key, cd) in commands_cd.items():
-            if self.can_claim(user[key], cd):
-                value = "✅ Ready"
-            else:
-                if name == "Weekly":
-                    value = self.remaining(user[key], cd, show_days=True)
-                else:
-                    value = self.remaining(user[key], cd)
-
-            embed.add_field(name=name, value=value, inline=False)
+        # Every cog registers its cooldowns, so this covers pets and XP too
+        for cooldown in self.bot.cooldowns:
+            value = "✅ Ready" if cooldown.ready(user) else cooldown.remaining(user)
+            embed.add_field(name=cooldown.name, value=value, inline=False)
 
         await ctx.send(embed=embed)
 
@@ -4,9 +4,17 @@ from discord.utils import get
 import logging
 import os
 import asyncio
+import time
+from utils.store import Store
+from utils.backends import open_backend
+from utils.journal import Journal
+from utils.ranking import GuildRankings
+from utils.cooldowns import Cooldowns
+from utils.sessions import SessionRouter
+from utils.metrics import Metrics
 
 
-handler = logging.FileHandler(filename='discord.log',encoding='utf-8', mode='w')
+log = logging.getLogger("bot")
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
@@ -14,14 +22,35 @@ intents.members = True
 bot = commands.Bot(command_prefix='!', intents=intents)
 TOKEN = os.getenv("DISCORD_TOKEN")
 
+async def load_timed(name):
+    started = time.perf_counter()
+    try:
+        await bot.load_extension(name)
+    except Exception:
+        # One broken cog shouldn't keep the rest of the bot offline
+        log.exception("Failed to load %s", name)
+    else:
+        log.info("Loaded %s in %.0f ms", name, (time.perf_counter() - started) * 1000)
+
+# Runs once, after login and before the gateway connects. on_ready fires again on
+# every reconnect, so nothing that should only happen once belongs there
+@bot.event
+async def setup_hook():
+    started = time.perf_counter()
+    bot.store.start()
+    if os.getenv("METRICS_PORT"):
+        await bot.metrics.serve(int(os.getenv("METRICS_PORT")))
+    # Each cog's cog_load (resizing backgrounds, resuming games) overlaps the others.
+    # Gateway caches are still empty here, so cogs mustn't look up channels while loading
+    names = [f'cogs.{filename[:-3]}' for filename in sorted(os.listdir('./cogs')) if filename.endswith('.py')]
+    await asyncio.gather(*(load_timed(name) for name in names))
+    log.info("Started %d extensions in %.0f ms", len(bot.extensions), (time.perf_counter() - started) * 1000)
+
 @bot.event
 async def on_ready():
     print('Logged in as')
     print(bot.user.name)
     print('-----')
-    for filename in os.listdir('./cogs'):
-        if filename.endswith('.py'):
-            await bot.load_extension(f'cogs.{filename[:-3]}')
 
 @bot.command()
 @commands.is_owner()
@@ -52,4 +81,42 @@ async def help2(ctx):
         e.add_field(name=cog_name, value=values, inline=True)
     await ctx.send(embed=e)
 
-bot.run(TOKEN)
+async def run_bot():
+    async with bot:
+        try:
+            await bot.start(TOKEN)
+        finally:
+            # Still inside the loop, so the /metrics server can shut down cleanly
+            await bot.metrics.close()
+
+# The card renderer's workers are started with spawn (see utils/cards.py), which imports
+# this file again in every worker; only the real run may open the data files and log in
+if __name__ == "__main__":
+    handler = logging.FileHandler(filename='discord.log',encoding='utf-8', mode='w')
+    # Set up before loading the store so its warnings land in discord.log too;
+    # root so our own modules (utils.store, utils.metrics, ...) log there as well
+    discord.utils.setup_logging(handler=handler, root=True)
+
+    # Shared economy data, loaded once and used by every cog
+    # ECONOMY_BACKEND=sqlite keeps one row per user instead of rewriting data.json
+    backend = open_backend(os.getenv("ECONOMY_BACKEND", "json"), os.getenv("ECONOMY_PATH"))
+    # Every change is appended to the journal, so full snapshots can be rare
+    journal = Journal(os.path.splitext(backend.path)[0] + ".journal")
+    bot.store = Store(backend, journal, flush_interval=300, batch_size=5000)
+    bot.store.load()
+    bot.rankings = GuildRankings(bot.store)
+    bot.cooldowns = Cooldowns()
+    # Replies to multi-step games ("hit", "stand") go straight to their session
+    bot.sessions = SessionRouter(bot)
+    bot.add_listener(bot.sessions.on_message)
+    # Command latency, errors and storage I/O for !stats and Prometheus
+    bot.metrics = Metrics()
+    bot.metrics.install(bot)
+    bot.metrics.add_source("store", bot.store.stats)
+
+    try:
+        asyncio.run(run_bot())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bot.store.close()
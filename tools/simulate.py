@@ -0,0 +1,151 @@
+"""Monte Carlo payouts for the gambling games and fishing.
+
+Plays each game many millions of times in NumPy batches, using the rule
+constants from utils/games.py, and prints return-to-player, house edge,
+variance and how much money a player population adds to (or drains from)
+the economy per day.
+
+    python -m tools.simulate --rounds 20000000 --players 500 --bet 100
+
+Needs NumPy, which the bot itself does not (pip install numpy).
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+
+from utils.games import (
+    BLACKJACK, CARD_HIGH, CARD_LOW, DEALER_STANDS, DICE_COUNT, DICE_SIDES,
+    FISH_COOLDOWN, FISH_TABLE, SLOT_JACKPOT, SLOT_PAIR, SLOT_REELS, SLOT_SYMBOLS
+)
+
+
+# ---------- One batch per game, net coins per round for a bet of 1 ----------
+def coinflip(rng, n, args):
+    # The player's call doesn't matter against a fair coin, so always call heads
+    return np.where(rng.integers(0, 2, n) == 0, 1, -1)
+
+
+def slots(rng, n, args):
+    reels = rng.integers(0, len(SLOT_SYMBOLS), (n, SLOT_REELS))
+    a, b, c = reels[:, 0], reels[:, 1], reels[:, 2]
+    jackpot = (a == b) & (b == c)
+    pair = (a == b) | (b == c) | (a == c)
+    return np.where(jackpot, SLOT_JACKPOT, np.where(pair, SLOT_PAIR, -1))
+
+
+def dice(rng, n, args):
+    player = rng.integers(1, DICE_SIDES + 1, (n, DICE_COUNT)).sum(axis=1)
+    bot = rng.integers(1, DICE_SIDES + 1, (n, DICE_COUNT)).sum(axis=1)
+    return np.sign(player - bot)
+
+
+def draw(rng, n):
+    return rng.integers(CARD_LOW, CARD_HIGH + 1, n)
+
+
+def blackjack(rng, n, args):
+    """Blackjack.hit/stand for a player who hits below `--stand-on`"""
+    player = draw(rng, n) + draw(rng, n)
+    dealer = draw(rng, n) + draw(rng, n)
+
+    # Dealt 21 or more stands straight away, as does reaching the stand-on total
+    hitting = player < min(args.stand_on, BLACKJACK)
+    bust = np.zeros(n, dtype=bool)
+    while hitting.any():
+        player[hitting] += draw(rng, int(hitting.sum()))
+        bust |= hitting & (player > BLACKJACK)
+        hitting &= player < min(args.stand_on, BLACKJACK)
+
+    drawing = dealer < DEALER_STANDS
+    while drawing.any():
+        dealer[drawing] += draw(rng, int(drawing.sum()))
+        drawing &= dealer < DEALER_STANDS
+
+    win = ~bust & ((dealer > BLACKJACK) | (player > dealer))
+    lose = bust | (player < dealer)
+    return np.where(win, 1, np.where(lose, -1, 0))
+
+
+def fish(rng, n, args):
+    """Coins per cast; fishing costs nothing, so this is pure money creation"""
+    chances = np.array([row[0] for row in FISH_TABLE])
+    low = np.array([row[2] for row in FISH_TABLE])
+    high = np.array([row[3] for row in FISH_TABLE])
+    tier = np.searchsorted(chances, rng.random(n), side="left")
+    return rng.integers(low[tier], high[tier] + 1)
+
+
+GAMES = {
+    "coinflip": coinflip,
+    "slots": slots,
+    "dice": dice,
+    "blackjack": blackjack,
+    "fish": fish
+}
+
+
+# ---------- Running ----------
+def simulate(game, rng, args):
+    """(mean, variance) of the net per round over args.rounds rounds"""
+    total = 0.0
+    squares = 0.0
+    left = args.rounds
+    while left:
+        n = min(left, args.batch)
+        net = GAMES[game](rng, n, args).astype(np.float64)
+        total += net.sum()
+        squares += np.square(net).sum()
+        left -= n
+    mean = total / args.rounds
+    return mean, squares / args.rounds - mean * mean
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=10_000_000, help="rounds per game")
+    parser.add_argument("--batch", type=int, default=1_000_000, help="rounds per NumPy batch")
+    parser.add_argument("--games", nargs="+", choices=GAMES, default=list(GAMES))
+    parser.add_argument("--bet", type=int, default=100, help="coins bet per round")
+    parser.add_argument("--players", type=int, default=1000, help="active players per day")
+    parser.add_argument("--plays", type=float, default=20, help="gambling rounds per player per day, per game")
+    parser.add_argument("--stand-on", type=int, default=DEALER_STANDS, help="blackjack total the player stands on")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    # Fishing is capped by its cooldown rather than by how much players want to bet
+    casts = 86400 / FISH_COOLDOWN
+
+    print(f"{args.rounds:,} rounds per game, bet {args.bet}, {args.players:,} players")
+    print(f"{'game':<10} {'RTP':>8} {'edge':>8} {'stdev':>9} {'±RTP':>8} {'drift/day':>14} {'±drift':>12} {'rounds/s':>12}")
+    for game in args.games:
+        started = time.perf_counter()
+        mean, variance = simulate(game, rng, args)
+        elapsed = time.perf_counter() - started
+        stdev = math.sqrt(variance)
+
+        if game == "fish":
+            rounds_per_day = args.players * casts
+            drift, spread = mean * rounds_per_day, stdev * math.sqrt(rounds_per_day)
+            print(
+                f"{game:<10} {'-':>8} {'-':>8} {stdev:>9.2f} {'-':>8} "
+                f"{drift:>+14,.0f} {spread:>12,.0f} {args.rounds / elapsed:>12,.0f}"
+                f"   ({mean:.2f} coins per cast, {casts:.0f} casts/day)"
+            )
+            continue
+
+        rounds_per_day = args.players * args.plays
+        # Nets are per unit bet; drift scales with the bet
+        drift = mean * args.bet * rounds_per_day
+        spread = stdev * args.bet * math.sqrt(rounds_per_day)
+        error = 1.96 * stdev / math.sqrt(args.rounds)
+        print(
+            f"{game:<10} {1 + mean:>8.2%} {-mean:>+8.2%} {stdev:>9.3f} {error:>8.3%} "
+            f"{drift:>+14,.0f} {spread:>12,.0f} {args.rounds / elapsed:>12,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import asyncio
+import collections
+import time
+
+import aiohttp
+
+from utils.cards import prepare_avatar
+
+
+class AvatarUnavailable(Exception):
+    """Raised when an avatar can't be downloaded (network error, timeout, CDN error status)"""
+
+
+class AvatarEntry:
+    __slots__ = ("pixels", "etag", "last_modified", "checked_at")
+
+    def __init__(self, pixels, etag, last_modified):
+        self.pixels = pixels
+        self.etag = etag
+        self.last_modified = last_modified
+        self.checked_at = time.monotonic()
+
+
+class AvatarCache:
+    """Avatars decoded and circle-cropped, ready to paste on a card.
+
+    Keyed by the avatar hash, so a new avatar is a new entry. Entries older
+    than `ttl` seconds are revalidated with a conditional request, which
+    costs a 304 and no decode when nothing changed. Concurrent requests for
+    the same avatar share one download, and every download goes through a
+    single pooled HTTP session.
+    """
+
+    def __init__(self, renderer, max_entries=2048, ttl=86400):
+        self.renderer = renderer
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.inflight = {}
+        self.session = None
+        self.hits = 0
+        self.fetches = 0
+        self.revalidated = 0
+
+    async def get(self, asset):
+        """Raw 100x100 RGBA bytes for a discord.Asset"""
+        key = asset.key
+        entry = self.entries.get(key)
+        if entry is not None and time.monotonic() - entry.checked_at < self.ttl:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry.pixels
+
+        task = self.inflight.get(key)
+        if task is None:
+            task = self.inflight[key] = asyncio.create_task(self._fetch(asset, entry))
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        # shield: one impatient caller being cancelled mustn't cancel the shared download
+        return await asyncio.shield(task)
+
+    async def _fetch(self, asset, entry):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=16),
+                timeout=aiohttp.ClientTimeout(total=10)
+            )
+
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        url = asset.with_static_format("png").with_size(128).url
+        try:
+            async with self.session.get(url, headers=headers) as response:
+                if response.status == 304 and entry is not None:
+                    entry.checked_at = time.monotonic()
+                    # It may have been evicted while the request was out
+                    self._remember(asset.key, entry)
+                    self.revalidated += 1
+                    return entry.pixels
+                response.raise_for_status()
+                raw = await response.read()
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            raise AvatarUnavailable(url) from error
+
+        self.fetches += 1
+        pixels = await self.renderer.run(prepare_avatar, raw)
+        self._remember(asset.key, AvatarEntry(pixels, etag, last_modified))
+        return pixels
+
+    def _remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "fetches": self.fetches,
+            "revalidated": self.revalidated
+        }
@@ -0,0 +1,182 @@
+import json
+import logging
+import os
+import sqlite3
+import sys
+
+from utils.records import SCHEMA_VERSION, UserRecord
+
+log = logging.getLogger(__name__)
+
+# Columns kept outside the JSON blob so they can be indexed and sorted on
+INDEXED = ("money", "xp", "level")
+
+
+def atomic_write(path, text):
+    """Replace `path` with `text` so a crash leaves either the old or the new file.
+
+    Returns the number of bytes written.
+    """
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+        written = f.tell()
+    os.replace(tmp, path)
+    # Make the rename itself durable
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    return written
+
+
+class JsonBackend:
+    """Whole-file storage in data.json.
+
+    v2 files look like {"version": 2, "users": {...}}; a bare user map is
+    the v1 layout and is migrated by the store on load.
+
+    Every user's `"id":{...}` fragment is kept encoded, seeded from the file
+    on load. A snapshot only re-encodes the users that changed, on the event
+    loop; joining the fragments into a file happens in the writer thread.
+    """
+
+    def __init__(self, path="data.json"):
+        self.path = path
+        self.fragments = {}  # user id -> encoded '"id":{...}'
+
+    def load(self):
+        path = self.path
+        if os.path.exists(path) and os.path.getsize(path) == 0:
+            # Writes are atomic now, so an empty file means an old truncated save
+            log.warning("%s is empty, trying %s.bak", path, path)
+            path = f"{path}.bak"
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return {}
+        with open(path, "r") as f:
+            stored = json.load(f)
+        users = stored["users"] if "version" in stored else stored
+        # What is on disk is what a snapshot would write for users that haven't changed
+        # (the store marks journaled and v1 users dirty, so those get re-encoded)
+        self.fragments = {user_id: _fragment(user_id, record) for user_id, record in users.items()}
+        return users
+
+    def prepare(self, data, dirty):
+        # A JSON file can't be patched in place, so any change means a full file,
+        # but only the changed users need encoding again
+        fragments = self.fragments
+        for user_id in dirty:
+            record = data.get(user_id)
+            if record is None:
+                fragments.pop(user_id, None)
+            else:
+                fragments[user_id] = _fragment(user_id, record.to_dict())
+        if len(fragments) != len(data):
+            # Users that were never dirty nor on disk (shouldn't happen, but never drop anyone)
+            for user_id in data.keys() - fragments.keys():
+                fragments[user_id] = _fragment(user_id, data[user_id].to_dict())
+        return list(fragments.values())
+
+    def write(self, fragments):
+        """Returns the bytes written"""
+        return atomic_write(self.path, f'{{"version":{SCHEMA_VERSION},"users":{{{",".join(fragments)}}}}}')
+
+    def close(self):
+        pass
+
+
+# Compact separators keep the snapshot small and quick to write; one shared
+# encoder because json.dumps builds a new one per call when given options
+_encode = json.JSONEncoder(separators=(",", ":")).encode
+
+
+def _fragment(user_id, record):
+    return f"{_encode(user_id)}:{_encode(record)}"
+
+
+class SqliteBackend:
+    """One row per user in SQLite, so a flush only touches the users that changed"""
+
+    def __init__(self, path="economy.db"):
+        self.path = path
+        # Writes run in a worker thread, one flush at a time
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            "user_id TEXT PRIMARY KEY, "
+            "money INTEGER NOT NULL DEFAULT 0, "
+            "xp INTEGER NOT NULL DEFAULT 0, "
+            "level INTEGER NOT NULL DEFAULT 1, "
+            "data TEXT NOT NULL DEFAULT '{}')"
+        )
+        for column in INDEXED:
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_users_{column} ON users({column})")
+        # Rows written before v2 still hold string timestamps; the store migrates them on load
+        self.conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        self.conn.commit()
+
+    def load(self):
+        data = {}
+        for user_id, money, xp, level, extra in self.conn.execute(
+            "SELECT user_id, money, xp, level, data FROM users"
+        ):
+            record = json.loads(extra)
+            record["money"] = money
+            record["xp"] = xp
+            record["level"] = level
+            data[user_id] = record
+        return data
+
+    def row(self, user_id, record):
+        extra = {k: v for k, v in record.to_dict().items() if k not in INDEXED}
+        return (user_id, record.money, record.xp, record.level, json.dumps(extra))
+
+    def prepare(self, data, dirty):
+        return [self.row(user_id, data[user_id]) for user_id in dirty if user_id in data]
+
+    def write(self, rows):
+        """Returns roughly the bytes written (row payloads, not SQLite's pages)"""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO users (user_id, money, xp, level, data) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET "
+                "money=excluded.money, xp=excluded.xp, level=excluded.level, data=excluded.data",
+                rows
+            )
+        return sum(len(row[0]) + len(row[4]) + 24 for row in rows)
+
+    def close(self):
+        self.conn.close()
+
+
+def open_backend(kind, path=None):
+    """Pick a backend by name ("json" or "sqlite")"""
+    if kind == "sqlite":
+        return SqliteBackend(path or "economy.db")
+    if kind == "json":
+        return JsonBackend(path or "data.json")
+    raise ValueError(f"Unknown storage backend: {kind}")
+
+
+def import_json(json_path, db_path):
+    """One-shot copy of a data.json file into a SQLite database"""
+    source = JsonBackend(json_path).load()
+    target = SqliteBackend(db_path)
+    target.write([target.row(user_id, UserRecord.from_dict(stored)) for user_id, stored in source.items()])
+    target.close()
+    return len(source)
+
+
+if __name__ == "__main__":
+    # python -m utils.backends data.json.bak economy.db
+    if len(sys.argv) != 3:
+        print("usage: python -m utils.backends <data.json> <economy.db>")
+        sys.exit(1)
+    count = import_json(sys.argv[1], sys.argv[2])
+    print(f"Imported {count} users into {sys.argv[2]}")
@@ -0,0 +1,348 @@
+import asyncio
+import collections
+import concurrent.futures
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+
+CARD_SIZE = (600, 300)
+AVATAR_SIZE = (100, 100)
+FONT_PATH = "arial.ttf"  # make sure you have this or any ttf font
+
+# Card encodings Discord can show inline; PNG is lossless, the others take a quality
+OUTPUT_FORMATS = {"png": "PNG", "webp": "WEBP", "jpeg": "JPEG"}
+# zlib level for PNG cards: 3 is ~50 ms a card against ~400 ms for optimize=True, for a file ~10% bigger
+PNG_COMPRESS_LEVEL = 3
+
+# Set once per worker process by _init_worker
+_fonts = None
+_output = ("webp", 85)
+# Card-sized backgrounds this worker has already decoded, keyed by (path, mtime)
+_backgrounds = collections.OrderedDict()
+
+
+class RendererBusy(Exception):
+    """Raised when too many cards are already queued"""
+
+
+# ---------- Worker side ----------
+# Pillow is imported inside the worker functions so the bot process never pays for it;
+# only the renderer's workers, which import it once when they start, do
+def _init_worker(font_path, output_format, quality):
+    from PIL import ImageFont
+
+    global _fonts, _output
+    _output = (output_format, quality)
+    try:
+        _fonts = (ImageFont.truetype(font_path, 28), ImageFont.truetype(font_path, 22))
+    except OSError:
+        # A broken initializer would take the whole pool down, so fall back
+        _fonts = (ImageFont.load_default(), ImageFont.load_default())
+
+
+def _background(path, mtime):
+    from PIL import Image
+
+    key = (path, mtime)
+    image = _backgrounds.get(key)
+    if image is None:
+        # Already card-sized by prepare_backgrounds, so this is a small decode
+        image = _backgrounds[key] = Image.open(path).convert("RGBA")
+        while len(_backgrounds) > 16:
+            _backgrounds.popitem(last=False)
+    else:
+        _backgrounds.move_to_end(key)
+    return image.copy()
+
+
+def _encode(image):
+    output_format, quality = _output
+    with io.BytesIO() as image_binary:
+        if output_format == "png":
+            image.save(image_binary, "PNG", compress_level=PNG_COMPRESS_LEVEL)
+        else:
+            # Cards are opaque, dropping alpha makes lossy output smaller
+            image.convert("RGB").save(image_binary, OUTPUT_FORMATS[output_format], quality=quality)
+        return image_binary.getvalue()
+
+
+def render_card(spec):
+    """Draw a profile card and return the encoded image (runs in a worker)"""
+    from PIL import Image, ImageDraw
+
+    font_bold, font_regular = _fonts
+
+    base = _background(spec["background"], spec["background_mtime"])
+
+    draw = ImageDraw.Draw(base)
+
+    # Draw user info text
+    draw.text((20, 20), spec["name"], fill="white", font=font_bold)
+    draw.text((20, 60), f"Level: {spec['level']}", fill="white", font=font_regular)
+    draw.text((20, 90), f"Coins: {spec['money']}", fill="white", font=font_regular)
+    draw.text((20, 120), f"Joined: {spec['joined']}", fill="white", font=font_regular)
+
+    # Draw XP bar
+    xp = spec["xp"]
+    xp_next = spec["xp_next"]
+    bar_width = 400
+    bar_height = 25
+    bar_x = 20
+    bar_y = 160
+
+    # Background bar
+    draw.rectangle([bar_x, bar_y, bar_x + bar_width, bar_y + bar_height], fill=(100,100,100,255))
+    # Filled XP
+    fill_width = int((xp / xp_next) * bar_width)
+    draw.rectangle([bar_x, bar_y, bar_x + fill_width, bar_y + bar_height], fill=(0,255,0,255))
+    draw.text((bar_x + bar_width + 10, bar_y), f"{xp}/{xp_next} XP", fill="white", font=font_regular)
+
+    # Draw user avatar (already circle-cropped by prepare_avatar)
+    avatar_img = Image.frombytes("RGBA", AVATAR_SIZE, spec["avatar"])
+    base.paste(avatar_img, (480,20), avatar_img)
+
+    return _encode(base)
+
+
+def prepare_avatar(raw):
+    """Decode an avatar, resize and circle-crop it; returns raw RGBA bytes (runs in a worker)"""
+    from PIL import Image, ImageDraw
+
+    avatar_img = Image.open(io.BytesIO(raw)).convert("RGBA")
+    avatar_img = avatar_img.resize(AVATAR_SIZE)
+    # Circle crop avatar by folding the circle into the alpha channel
+    mask = Image.new("L", AVATAR_SIZE, 0)
+    mask_draw = ImageDraw.Draw(mask)
+    mask_draw.ellipse((0, 0) + AVATAR_SIZE, fill=255)
+    alpha = avatar_img.getchannel("A")
+    avatar_img.putalpha(Image.composite(alpha, mask, mask))
+    return avatar_img.tobytes()
+
+
+def render_contact_sheet(entries, columns=3):
+    """One gallery image of [(name, prepared path), ...] with a label under each (runs in a worker)"""
+    from PIL import Image, ImageDraw
+
+    font_regular = _fonts[1]
+    thumb_w, thumb_h = CARD_SIZE[0] // 3, CARD_SIZE[1] // 3
+    label_h = 30
+    rows = max(1, -(-len(entries) // columns))
+    sheet = Image.new("RGBA", (columns * thumb_w, rows * (thumb_h + label_h)), (47, 49, 54, 255))
+    draw = ImageDraw.Draw(sheet)
+    for index, (name, path) in enumerate(entries):
+        x = (index % columns) * thumb_w
+        y = (index // columns) * (thumb_h + label_h)
+        with Image.open(path) as image:
+            sheet.paste(image.convert("RGBA").resize((thumb_w, thumb_h)), (x, y))
+        draw.text((x + 5, y + thumb_h + 4), name, fill="white", font=font_regular)
+    return _encode(sheet)
+
+
+def prepare_backgrounds(src_dir, out_dir):
+    """Write a card-sized PNG of every image in src_dir to out_dir (runs in a worker).
+
+    Files whose copy is newer than the source are skipped. Returns
+    {source file name: prepared path}.
+    """
+    from PIL import Image
+
+    os.makedirs(out_dir, exist_ok=True)
+    prepared = {}
+    for name in os.listdir(src_dir):
+        source = os.path.join(src_dir, name)
+        if not os.path.isfile(source):
+            continue
+        # Keep the source extension: x.jpg and x.png are different presets
+        target = os.path.join(out_dir, name + ".png")
+        if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(source):
+            try:
+                image = Image.open(source).convert("RGBA").resize(CARD_SIZE)
+            except OSError:
+                continue  # Not an image
+            # Per-process temp name, so two bots sharing the cache can't trip over each other
+            tmp = f"{target}.{os.getpid()}.tmp"
+            image.save(tmp, "PNG", compress_level=1)
+            os.replace(tmp, target)
+        prepared[name] = target
+    return prepared
+
+
+# ---------- Bot side ----------
+class CardRenderer:
+    """Runs Pillow work in a process pool so the event loop never blocks on it.
+
+    Fonts load once per worker. At most `max_pending` jobs may be queued or
+    running; past that `RendererBusy` is raised so callers can push back
+    instead of piling up work. Cards come out as `output_format` ("png",
+    "webp" or "jpeg"; `quality` applies to the lossy two).
+
+    Workers are always started with spawn, whatever the platform default,
+    so they never fork a bot holding threads, sockets and open data files.
+    Spawn imports the entry script again in each worker, so its start-up
+    must sit under `if __name__ == "__main__":` as main.py's does.
+    """
+
+    def __init__(self, workers=2, max_pending=8, font_path=FONT_PATH, output_format="webp", quality=85):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown card format: {output_format}")
+        self.pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(font_path, output_format, quality)
+        )
+        self.output_format = output_format
+        self.quality = quality
+        self.max_pending = max_pending
+        self.pending = 0
+
+    async def run(self, func, *args):
+        if self.pending >= self.max_pending:
+            raise RendererBusy()
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.pool, func, *args)
+        finally:
+            self.pending -= 1
+
+    async def render(self, spec):
+        return await self.run(render_card, spec)
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class CardCache:
+    """Rendered cards keyed by a hash of everything drawn on them.
+
+    Memory is an LRU bounded by total bytes. With `disk_dir` set, cards
+    are also kept on disk and survive restarts; the disk copy is bounded
+    by `max_disk_bytes` too, dropping the least recently used files
+    (by mtime, which a disk hit refreshes). The counters say how well
+    the cache is sized: a low hit rate with many evictions wants more room.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, disk_dir=None, max_disk_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.disk = collections.OrderedDict()  # key -> file size, least recently used first
+        self.disk_size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._scan_disk()
+
+    @staticmethod
+    def key(fields):
+        """Content address for a card; `fields` must be JSON-serializable"""
+        encoded = json.dumps(fields, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode()).hexdigest()
+
+    async def get(self, key):
+        data = self.entries.get(key)
+        if data is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+        if key in self.disk:
+            data = await asyncio.to_thread(self._read_disk, key)
+            if data is not None:
+                self.disk_hits += 1
+                if key in self.disk:
+                    self.disk.move_to_end(key)
+                self._remember(key, data)
+                return data
+
+        self.misses += 1
+        return None
+
+    async def put(self, key, data):
+        self._remember(key, data)
+        if self.disk_dir:
+            await asyncio.to_thread(self._write_disk, key, data)
+            self.disk_size += len(data) - self.disk.pop(key, 0)
+            self.disk[key] = len(data)
+            old = []
+            while self.disk_size > self.max_disk_bytes and len(self.disk) > 1:
+                old_key, size = self.disk.popitem(last=False)
+                self.disk_size -= size
+                self.disk_evictions += 1
+                old.append(old_key)
+            if old:
+                await asyncio.to_thread(self._remove_disk, old)
+
+    def _remember(self, key, data):
+        if key in self.entries:
+            self.size -= len(self.entries.pop(key))
+        self.entries[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            _, old = self.entries.popitem(last=False)
+            self.size -= len(old)
+            self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.bin")
+
+    def _scan_disk(self):
+        # Pick up what earlier runs left, oldest first; leftovers of interrupted writes go
+        found = []
+        with os.scandir(self.disk_dir) as listing:
+            for item in listing:
+                if item.name.endswith(".tmp"):
+                    os.remove(item.path)
+                elif item.name.endswith(".bin"):
+                    info = item.stat()
+                    found.append((info.st_mtime, item.name[:-4], info.st_size))
+        for _, key, size in sorted(found):
+            self.disk[key] = size
+            self.disk_size += size
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # Mark it recently used for the next restart's scan
+            os.utime(path)
+            return data
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key, data):
+        tmp = self._path(key) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self._path(key))
+
+    def _remove_disk(self, keys):
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_bytes": self.disk_size,
+            "disk_evictions": self.disk_evictions,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0
+        }
@@ -0,0 +1,89 @@
+import asyncio
+import bisect
+import os
+
+from utils.cards import RendererBusy, prepare_backgrounds, render_contact_sheet
+
+
+class ImageCatalog:
+    """The preset profile images, indexed for lookup by name prefix.
+
+    The folder is only re-read when its mtime changes (a file added,
+    removed or renamed). A refresh also resizes new images to card size
+    for the renderer; callers that notice the same change share one run.
+    If the renderer is too busy for it, the previous listing keeps being
+    served and the next lookup tries again. The `!images` gallery is
+    built once per folder state and handed out as bytes until the folder
+    changes again.
+    """
+
+    def __init__(self, renderer, src_dir, out_dir=".cache/backgrounds"):
+        self.renderer = renderer
+        self.src_dir = src_dir
+        self.out_dir = out_dir
+        self.paths = {}  # image name -> card-sized copy
+        self.index = []  # (lowercased name, name), sorted
+        self.mtime = None
+        self.gallery = None
+        self.inflight = {}  # folder mtime -> task re-reading it
+
+    def __len__(self):
+        return len(self.paths)
+
+    def names(self):
+        return [name for _, name in self.index]
+
+    async def refresh(self):
+        try:
+            mtime = os.stat(self.src_dir).st_mtime_ns
+        except FileNotFoundError:
+            self.paths, self.index, self.mtime, self.gallery = {}, [], None, None
+            return
+        if mtime == self.mtime:
+            return
+        task = self.inflight.get(mtime)
+        if task is None:
+            task = self.inflight[mtime] = asyncio.create_task(self._load(mtime))
+            task.add_done_callback(lambda _: self.inflight.pop(mtime, None))
+        try:
+            # shield: a cancelled command mustn't cancel the run the others wait on
+            await asyncio.shield(task)
+        except RendererBusy:
+            if self.mtime is None:
+                raise  # Nothing to fall back on yet
+
+    async def _load(self, mtime):
+        paths = await self.renderer.run(prepare_backgrounds, self.src_dir, self.out_dir)
+        self.paths = paths
+        self.index = sorted((name.lower(), name) for name in paths)
+        self.mtime = mtime
+        self.gallery = None
+
+    async def background(self, name):
+        """Card-sized path for a preset image name, or None"""
+        await self.refresh()
+        return self.paths.get(name)
+
+    async def matches(self, prefix):
+        """Image names starting with `prefix` (case-insensitive), in name order"""
+        await self.refresh()
+        prefix = prefix.lower()
+        position = bisect.bisect_left(self.index, (prefix,))
+        found = []
+        while position < len(self.index) and self.index[position][0].startswith(prefix):
+            found.append(self.index[position][1])
+            position += 1
+        return found
+
+    async def find(self, prefix):
+        """First image name starting with `prefix`, or None"""
+        found = await self.matches(prefix)
+        return found[0] if found else None
+
+    async def contact_sheet(self):
+        """Thumbnail gallery of every preset image, encoded like the cards"""
+        await self.refresh()
+        if self.gallery is None and self.index:
+            entries = [(name, self.paths[name]) for _, name in self.index]
+            self.gallery = await self.renderer.run(render_contact_sheet, entries)
+        return self.gallery
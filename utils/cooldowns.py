@@ -0,0 +1,68 @@
+from utils.records import now
+
+
+class Cooldown:
+    """A named cooldown stored as an epoch timestamp on the user record"""
+
+    __slots__ = ("name", "field", "seconds", "show_days", "order")
+
+    def __init__(self, name, field, seconds, show_days=False, order=0):
+        self.name = name
+        self.field = field
+        self.seconds = seconds
+        self.show_days = show_days
+        self.order = order
+
+    def left(self, record):
+        """Seconds until ready (0 or less means ready)"""
+        return getattr(record, self.field) + self.seconds - now()
+
+    def ready(self, record):
+        return self.left(record) <= 0
+
+    def remaining(self, record):
+        """Time left as text, e.g. "1h 5m" """
+        return format_duration(self.left(record), self.show_days)
+
+
+class Cooldowns:
+    """Every cooldown in the bot, registered by the cog that owns it.
+
+    Lets `!cd` list all of them without each cog keeping its own table.
+    They are listed by `order`, not by which cog happened to load first,
+    and a cog unregisters its own when it unloads.
+    """
+
+    def __init__(self):
+        self.registry = {}
+
+    def register(self, name, field, seconds, show_days=False, order=0):
+        # Re-registering (e.g. on cog reload) just replaces the old entry
+        cooldown = self.registry[name] = Cooldown(name, field, seconds, show_days, order)
+        return cooldown
+
+    def unregister(self, *cooldowns):
+        for cooldown in cooldowns:
+            # Only if it is still this one, not a newer registration under the same name
+            if self.registry.get(cooldown.name) is cooldown:
+                del self.registry[cooldown.name]
+
+    def __getitem__(self, name):
+        return self.registry[name]
+
+    def __iter__(self):
+        return iter(sorted(self.registry.values(), key=lambda cooldown: (cooldown.order, cooldown.name)))
+
+
+def format_duration(total_seconds, show_days=False):
+    total_seconds = max(0, int(total_seconds))
+    if total_seconds < 60:
+        return f"{total_seconds}s"
+    if show_days:
+        days, remainder = divmod(total_seconds, 86400)
+        hours, remainder = divmod(remainder, 3600)
+        minutes, _ = divmod(remainder, 60)
+        return f"{days}d {hours}h {minutes}m"
+    hours, remainder = divmod(total_seconds, 3600)
+    minutes, _ = divmod(remainder, 60)
+    return f"{hours}h {minutes}m"
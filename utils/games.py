@@ -0,0 +1,221 @@
+import random
+
+from utils.records import now
+
+# ---------- Rules ----------
+# Everything that decides a payout lives here, so the cogs and the offline
+# simulator (tools/simulate.py) play by exactly the same rules.
+
+COIN_SIDES = ("heads", "tails")
+
+SLOT_SYMBOLS = ("🍒", "🍋", "🔔", "⭐", "💎")
+SLOT_REELS = 3
+SLOT_JACKPOT = 5  # all three match: win bet * 5
+SLOT_PAIR = 2  # any two match: win bet * 2
+
+DICE_COUNT = 3
+DICE_SIDES = 6
+
+CARD_LOW, CARD_HIGH = 1, 11
+BLACKJACK = 21
+DEALER_STANDS = 17
+
+FISH_COOLDOWN = 20 * 60  # 20 minutes
+
+# (cumulative chance, fish, min coins, max coins), rarest first
+FISH_TABLE = (
+    (0.001, "Extremely Rare Fish 🦑", 500, 800),  # 0.1% extremely rare
+    (0.011, "Very Rare Fish 🐡", 200, 400),  # 1% very rare
+    (0.061, "Rare Fish 🐠", 50, 100),  # 5% rare
+    (1.0, "Common Fish 🐟", 10, 25)
+)
+
+
+def flip_coin():
+    return random.choice(COIN_SIDES)
+
+
+def coinflip_net(choice, result, bet):
+    return bet if result == choice else -bet
+
+
+def spin_slots():
+    return [random.choice(SLOT_SYMBOLS) for _ in range(SLOT_REELS)]
+
+
+def slots_net(result, bet):
+    """(coins won or lost, "jackpot" / "pair" / None)"""
+    if result[0] == result[1] == result[2]:
+        return bet * SLOT_JACKPOT, "jackpot"
+    if result[0] == result[1] or result[1] == result[2] or result[0] == result[2]:
+        return bet * SLOT_PAIR, "pair"
+    return -bet, None
+
+
+def roll_dice():
+    return [random.randint(1, DICE_SIDES) for _ in range(DICE_COUNT)]
+
+
+def dice_net(user_total, bot_total, bet):
+    if user_total > bot_total:
+        return bet
+    if user_total < bot_total:
+        return -bet
+    return 0
+
+
+def catch_fish():
+    """(fish, coins) for one cast"""
+    roll = random.random()
+    for chance, fish, low, high in FISH_TABLE:
+        if roll <= chance:
+            return fish, random.randint(low, high)
+
+
+# ---------- Multi-step games ----------
+# Session kind -> Game subclass, filled in by @register_game
+GAMES = {}
+
+
+def register_game(cls):
+    GAMES[cls.kind] = cls
+    return cls
+
+
+def load_game(data):
+    """Rebuild a game from the dict stored in UserRecord.games"""
+    return GAMES[data["kind"]].from_dict(data)
+
+
+def running_game(record, channel_id):
+    """The game `record` has running in a channel, or None"""
+    if not record.games:
+        return None
+    data = record.games.get(str(channel_id))
+    return load_game(data) if data is not None else None
+
+
+def store_game(record, channel_id, game):
+    """Save a game's new state on the record, or settle it once finished.
+
+    Settling drops the game and pays out of the bet it reserved, in the
+    same transaction as the move that finished it, so a game can only be
+    paid once.
+    """
+    games = dict(record.games or {})
+    if game.finished:
+        games.pop(str(channel_id), None)
+        record.money += game.payout()
+    else:
+        games[str(channel_id)] = game.to_dict()
+    record.games = games or None
+
+
+class Game:
+    """A multi-step game, stored in the player's record between moves.
+
+    A game is a small state machine: `phase` says which moves are allowed,
+    each move advances it, and the whole thing round-trips through a plain
+    dict so it can sit in the store next to the bet it holds. `expires` is
+    the epoch second the game times out at, so a restarted bot can pick
+    the timer back up.
+
+    The bet is taken from the player when the game starts and `payout`
+    says how much of it (or more) goes back once the game is finished.
+    """
+
+    kind = None
+    moves = ()  # words a player answers with between steps
+    timeout = 30  # seconds allowed per move
+    fields = ("bet", "phase", "expires")
+
+    def __init__(self, bet):
+        self.bet = bet
+        self.phase = "playing"
+        self.expires = now() + self.timeout
+
+    @classmethod
+    def from_dict(cls, data):
+        game = cls.__new__(cls)
+        for field in cls.fields:
+            value = data[field]
+            # Own copies, so a move never edits the dict still stored in the record
+            setattr(game, field, list(value) if isinstance(value, list) else value)
+        return game
+
+    def to_dict(self):
+        data = {field: getattr(self, field) for field in self.fields}
+        data["kind"] = self.kind
+        return data
+
+    @property
+    def finished(self):
+        return self.phase == "finished"
+
+    def touch(self):
+        """Give the player a full move's time again"""
+        self.expires = now() + self.timeout
+
+    def payout(self):
+        return 0
+
+
+def draw_card():
+    return random.randint(CARD_LOW, CARD_HIGH)
+
+
+@register_game
+class Blackjack(Game):
+    """Player against the dealer; cards are 1-11 and the dealer hits below 17.
+
+    A player reaching 21 (or dealt 21 or more) stands automatically.
+
+    playing --hit--> playing, or finished on a bust or 21
+    playing --stand/timeout--> finished
+    """
+
+    kind = "blackjack"
+    moves = ("hit", "stand")
+    fields = Game.fields + ("player", "dealer", "result")
+
+    def __init__(self, bet):
+        super().__init__(bet)
+        self.player = [draw_card(), draw_card()]
+        self.dealer = [draw_card(), draw_card()]
+        self.result = None  # "bust", "win", "lose" or "tie" once finished
+        if self.player_total >= BLACKJACK:
+            self.stand()
+
+    @property
+    def player_total(self):
+        return sum(self.player)
+
+    @property
+    def dealer_total(self):
+        return sum(self.dealer)
+
+    def hit(self):
+        card = draw_card()
+        self.player.append(card)
+        if self.player_total > BLACKJACK:
+            self.phase = "finished"
+            self.result = "bust"
+        elif self.player_total == BLACKJACK:
+            self.stand()
+        return card
+
+    def stand(self):
+        # Dealer's turn (hit until 17 or higher)
+        while self.dealer_total < DEALER_STANDS:
+            self.dealer.append(draw_card())
+        if self.dealer_total > BLACKJACK or self.player_total > self.dealer_total:
+            self.result = "win"
+        elif self.player_total < self.dealer_total:
+            self.result = "lose"
+        else:
+            self.result = "tie"
+        self.phase = "finished"
+
+    def payout(self):
+        """Coins paid back out of the reserved bet"""
+        return {"win": self.bet * 2, "tie": self.bet}.get(self.result, 0)
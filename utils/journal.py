@@ -0,0 +1,138 @@
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+
+from utils.metrics import Histogram
+
+log = logging.getLogger(__name__)
+
+
+class Journal:
+    """Append-only log of every field the store changes.
+
+    Each line is one mutation: [timestamp, user_id, field, new_value].
+    The log is split into numbered segments (data.journal.0, .1, ...).
+    When the store compacts, it starts a new segment, writes a snapshot
+    through the backend and only then deletes the older segments, so at
+    any point snapshot + remaining segments give the latest state.
+    Values are absolute, which makes replaying a segment twice harmless.
+
+    Appends go straight to the OS; `sync()` waits until they are on disk.
+    Syncs are group-committed: everything appended within `group_delay`
+    seconds shares a single fsync.
+    """
+
+    def __init__(self, path="data.journal", group_delay=0.005):
+        self.path = path
+        self.group_delay = group_delay
+        self.segment = 0
+        self.file = None
+        self._waiters = []
+        self._syncer = None
+        self.bytes_written = 0
+        self.sync_seconds = Histogram()  # one observation per group-committed fsync
+
+    def _segments(self):
+        found = []
+        for name in glob.glob(f"{glob.escape(self.path)}.*"):
+            suffix = name.rsplit(".", 1)[1]
+            if suffix.isdigit():
+                found.append((int(suffix), name))
+        return sorted(found)
+
+    # ---------- Startup ----------
+    def replay(self, data):
+        """Apply every surviving segment to the stored dicts in `data`; returns the users touched"""
+        touched = set()
+        for _, name in self._segments():
+            with open(name, "r") as f:
+                for line in f:
+                    try:
+                        _, user_id, field, value = json.loads(line)
+                    except ValueError:
+                        # A crash can leave the last line half written
+                        continue
+                    data.setdefault(user_id, {})[field] = value
+                    touched.add(user_id)
+        return touched
+
+    def open(self):
+        segments = self._segments()
+        self.segment = segments[-1][0] + 1 if segments else 0
+        self.file = open(f"{self.path}.{self.segment}", "a")
+
+    # ---------- Writing ----------
+    def append(self, user_id, changes, flush=True):
+        """Log changed fields; with flush=False they stay buffered until the next flush/sync"""
+        now = round(time.time(), 3)
+        lines = [json.dumps([now, user_id, field, value]) for field, value in changes.items()]
+        self.bytes_written += self.file.write("\n".join(lines) + "\n")
+        if flush:
+            self.file.flush()
+
+    async def sync(self):
+        """Wait until everything appended so far has been fsynced"""
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        if self._syncer is None or self._syncer.done():
+            self._syncer = asyncio.create_task(self._sync_loop())
+        await waiter
+
+    async def _sync_loop(self):
+        while self._waiters:
+            # Give other commands finishing right now a chance to join this fsync
+            await asyncio.sleep(self.group_delay)
+            waiters, self._waiters = self._waiters, []
+            try:
+                # Pick up buffered non-durable lines too, then fsync a duplicate
+                # so a rotate() closing the file can't pull it from under us
+                self.file.flush()
+                fd = os.dup(self.file.fileno())
+                started = time.perf_counter()
+                try:
+                    await asyncio.to_thread(os.fsync, fd)
+                finally:
+                    os.close(fd)
+                self.sync_seconds.observe(time.perf_counter() - started)
+            except Exception as e:
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(e)
+            else:
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result(None)
+
+    def rotate(self):
+        """Start a new segment; returns the older segments to discard after the snapshot"""
+        old = [name for number, name in self._segments() if number <= self.segment]
+        # Pending syncs will land on the new segment, so settle this one first
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        # Open the next segment before letting go of this one, so a failure
+        # (e.g. a full disk) leaves appends going to a file that is still open
+        new_file = open(f"{self.path}.{self.segment + 1}", "a")
+        self.file.close()
+        self.file = new_file
+        self.segment += 1
+        return old
+
+    def discard(self, names):
+        for name in names:
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # Replaying it again later is harmless, the values are absolute
+                log.exception("Couldn't remove old journal segment %s", name)
+
+    def close(self):
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            self.file = None
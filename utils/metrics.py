@@ -0,0 +1,185 @@
+import bisect
+import contextlib
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+# Upper bounds in seconds, Prometheus style; the last bucket catches everything
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+
+class Histogram:
+    """Counts of observations per latency bucket, plus their count and sum"""
+
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        """Estimate from the buckets, interpolating inside the one that holds it"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                low = BUCKETS[index - 1] if index else 0.0
+                high = BUCKETS[index] if index < len(BUCKETS) - 1 else low * 2
+                return low + (high - low) * (rank - seen) / count
+            seen += count
+        return BUCKETS[-2]
+
+
+class Metrics:
+    """Counters and latency histograms for commands and listeners.
+
+    `install` hooks every command on the bot through the global
+    before/after invoke hooks, so cogs need no changes to be measured.
+    Listeners time themselves with `timer`. Anything else with a
+    `stats()` dict (the store, caches) registers as a source and is read
+    when the metrics are shown.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.commands = {}  # name -> Histogram
+        self.errors = {}  # name -> count
+        self.listeners = {}  # name -> Histogram
+        self.listener_errors = {}
+        self.sources = {}  # name -> callable returning {stat: number}
+        self._runner = None
+
+    # ---------- Commands ----------
+    def install(self, bot):
+        bot.before_invoke(self._before_invoke)
+        bot.after_invoke(self._after_invoke)
+        bot.add_listener(self._on_command_error, "on_command_error")
+
+    async def _before_invoke(self, ctx):
+        ctx.metrics_started = time.perf_counter()
+
+    async def _after_invoke(self, ctx):
+        started = getattr(ctx, "metrics_started", None)
+        if started is None:
+            return
+        name = ctx.command.qualified_name
+        histogram = self.commands.get(name)
+        if histogram is None:
+            histogram = self.commands[name] = Histogram()
+        histogram.observe(time.perf_counter() - started)
+
+    async def _on_command_error(self, ctx, error):
+        name = ctx.command.qualified_name if ctx.command else "unknown"
+        self.errors[name] = self.errors.get(name, 0) + 1
+        # Any on_command_error listener switches off discord.py's default logging, so do it here
+        if ctx.command and ctx.command.has_error_handler():
+            return
+        if ctx.cog and ctx.cog.has_error_handler():
+            return
+        log.error("Ignoring exception in command %s", ctx.command, exc_info=error)
+
+    # ---------- Listeners ----------
+    @contextlib.contextmanager
+    def timer(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.listener_errors[name] = self.listener_errors.get(name, 0) + 1
+            raise
+        finally:
+            histogram = self.listeners.get(name)
+            if histogram is None:
+                histogram = self.listeners[name] = Histogram()
+            histogram.observe(time.perf_counter() - started)
+
+    # ---------- Sources ----------
+    def add_source(self, name, stats):
+        # Re-adding (e.g. on cog reload) just replaces the old one
+        self.sources[name] = stats
+
+    def remove_source(self, name):
+        self.sources.pop(name, None)
+
+    def read_sources(self):
+        return {name: stats() for name, stats in self.sources.items()}
+
+    # ---------- Export ----------
+    def prometheus(self):
+        """Everything in the Prometheus text exposition format"""
+        lines = [
+            "# TYPE bot_uptime_seconds gauge",
+            f"bot_uptime_seconds {time.time() - self.started:.3f}"
+        ]
+        _histograms(lines, "bot_command_seconds", "command", self.commands)
+        _counters(lines, "bot_command_errors_total", "command", self.errors)
+        _histograms(lines, "bot_listener_seconds", "listener", self.listeners)
+        _counters(lines, "bot_listener_errors_total", "listener", self.listener_errors)
+        for source, stats in self.read_sources().items():
+            for stat, value in stats.items():
+                if isinstance(value, Histogram):
+                    _histograms(lines, f"bot_{source}_{stat}", None, {None: value})
+                elif isinstance(value, (int, float)):
+                    lines.append(f"# TYPE bot_{source}_{stat} gauge")
+                    lines.append(f"bot_{source}_{stat} {value}")
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, port, host="0.0.0.0"):
+        """Serve /metrics for Prometheus to scrape (safe to call more than once)"""
+        if self._runner is not None:
+            return
+        from aiohttp import web
+
+        async def handle(request):
+            return web.Response(text=self.prometheus(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def _label(name, value):
+    if name is None:
+        return ""
+    return f'{name}="{value}"'
+
+
+def _histograms(lines, metric, label, histograms):
+    lines.append(f"# TYPE {metric} histogram")
+    for key, histogram in sorted(histograms.items(), key=lambda item: str(item[0])):
+        base = _label(label, key)
+        cumulative = 0
+        for bound, count in zip(BUCKETS, histogram.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            labels = f"{base},le=\"{le}\"" if base else f"le=\"{le}\""
+            lines.append(f"{metric}_bucket{{{labels}}} {cumulative}")
+        suffix = f"{{{base}}}" if base else ""
+        lines.append(f"{metric}_sum{suffix} {histogram.total:.6f}")
+        lines.append(f"{metric}_count{suffix} {histogram.count}")
+
+
+def _counters(lines, metric, label, counters):
+    lines.append(f"# TYPE {metric} counter")
+    for key, value in sorted(counters.items()):
+        lines.append(f"{metric}{{{_label(label, key)}}} {value}")
@@ -0,0 +1,139 @@
+import asyncio
+import collections
+import cProfile
+import gc
+import io
+import itertools
+import os
+import pstats
+import sys
+import threading
+
+
+async def cpu_profile(seconds, top=40, sort="cumulative"):
+    """cProfile everything the event loop runs for `seconds`; returns a pstats report.
+
+    Coroutines run on the loop's thread, so every command and listener that
+    runs in the window is captured (a coroutine shows up once per resume).
+    Work in thread pools and the card renderer's processes is not; it
+    appears as time spent awaiting them.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+    return out.getvalue()
+
+
+class StackSampler(threading.Thread):
+    """Samples a thread's Python stack every `interval` seconds from a side thread.
+
+    Unlike cProfile it adds no cost to the calls themselves, so timings stay
+    honest, and its output is collapsed stacks ("a;b;c count" per line),
+    ready for flamegraph.pl or speedscope. The sampler needs the GIL to look,
+    so it can't sample faster than sys.getswitchinterval() (5 ms by default)
+    while the loop is busy.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.stacks[collapse(frame)] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, count=30):
+        """Functions by how often they were on top of the stack (self time)"""
+        leaves = collections.Counter()
+        for stack, hits in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += hits
+        lines = [f"{self.samples} samples every {self.interval * 1000:g} ms"]
+        for name, hits in leaves.most_common(count):
+            lines.append(f"{hits / max(1, self.samples):7.2%}  {name}")
+        return "\n".join(lines) + "\n"
+
+
+def collapse(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        module = frame.f_globals.get("__name__", "?")
+        names.append(f"{module}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+async def sample_profile(seconds, interval=0.005):
+    """Sample the event loop's thread for `seconds`; returns the finished StackSampler"""
+    sampler = StackSampler(threading.get_ident(), interval)
+    sampler.start()
+    try:
+        # Idle loop time shows up as the selector wait, which is useful too
+        await asyncio.sleep(seconds)
+    finally:
+        await asyncio.to_thread(sampler.stop)
+    return sampler
+
+
+# ---------- Memory ----------
+def rss_bytes():
+    """Current resident set size, or the peak where the current one isn't available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def format_bytes(count):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(count) < 1024 or unit == "GiB":
+            return f"{count:.0f} {unit}" if unit == "B" else f"{count:.1f} {unit}"
+        count /= 1024
+
+
+def record_footprint(records, sample=1000):
+    """Rough bytes held by the user records, from the average of a sample"""
+    if not records:
+        return 0
+    picked = list(itertools.islice(records.values(), sample))
+    total = 0
+    for record in picked:
+        total += sys.getsizeof(record) + sys.getsizeof(record.owned_images)
+        if record.games:
+            total += sys.getsizeof(record.games)
+    # Plus the dict slot and the user id string per user
+    key = next(iter(records))
+    per_user = total / len(picked) + sys.getsizeof(key) + 3 * 8
+    return int(per_user * len(records))
+
+
+def type_counts(top=25):
+    """Most common types among gc-tracked objects (walks every object, so it blocks a moment)"""
+    counts = collections.Counter(type(obj).__name__ for obj in gc.get_objects())
+    return counts.most_common(top)
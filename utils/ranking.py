@@ -0,0 +1,285 @@
+import asyncio
+import heapq
+import itertools
+import random
+
+from sortedcontainers import SortedList
+
+# Members read per event loop turn while a guild's boards are built
+BUILD_CHUNK = 5000
+
+# How each leaderboard scores a user record; higher is better
+METRICS = {
+    "money": lambda record: record.money,
+    "level": lambda record: (record.level, record.xp)
+}
+
+
+class Board:
+    """One guild's ranking for one metric, kept sorted at all times"""
+
+    def __init__(self, score):
+        self.score = score
+        self.entries = SortedList()  # (-score, user_id), best first
+        self.by_user = {}
+
+    @classmethod
+    async def from_runs(cls, score, runs):
+        """A board from sorted runs of (-score, user_id) entries, built in one go instead of an insert per member.
+
+        The runs are merged a chunk per loop turn, so SortedList gets its
+        input already in order and its own sort is a single linear pass.
+        """
+        board = cls(score)
+        merged = heapq.merge(*runs)
+        entries = []
+        while True:
+            chunk = list(itertools.islice(merged, BUILD_CHUNK))
+            if not chunk:
+                break
+            entries.extend(chunk)
+            board.by_user.update((entry[1], entry) for entry in chunk)
+            await asyncio.sleep(0)
+        board.entries = SortedList(entries)
+        return board
+
+    def __len__(self):
+        return len(self.entries)
+
+    def update(self, user_id, record):
+        entry = (_negate(self.score(record)), user_id)
+        old = self.by_user.get(user_id)
+        if old == entry:
+            return
+        if old is not None:
+            self.entries.remove(old)
+        self.entries.add(entry)
+        self.by_user[user_id] = entry
+
+    def remove(self, user_id):
+        old = self.by_user.pop(user_id, None)
+        if old is not None:
+            self.entries.remove(old)
+
+    def rank(self, user_id):
+        """(rank, score, (user_id, score) of the next person above or None), or None if unranked.
+
+        Ties share a rank. SortedList bisects in O(log n), so this stays cheap
+        on guilds with hundreds of thousands of members.
+        """
+        entry = self.by_user.get(user_id)
+        if entry is None:
+            return None
+        # (key,) sorts before every (key, user_id), so this counts strictly better scores
+        better = self.entries.bisect_left((entry[0],))
+        above = None
+        if better:
+            key, above_id = self.entries[better - 1]
+            above = (above_id, _negate(key))
+        return better + 1, _negate(entry[0]), above
+
+    def page(self, start, count):
+        """[(user_id, score), ...] for positions start .. start+count-1 (0-based)"""
+        return [(user_id, _negate(key)) for key, user_id in self.entries[start:start + count]]
+
+
+class Pool:
+    """Set of user ids with O(1) add, remove and random pick"""
+
+    def __init__(self):
+        self.items = []
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, user_id):
+        return user_id in self.positions
+
+    def add(self, user_id):
+        if user_id not in self.positions:
+            self.positions[user_id] = len(self.items)
+            self.items.append(user_id)
+
+    def remove(self, user_id):
+        index = self.positions.pop(user_id, None)
+        if index is None:
+            return
+        # Move the last item into the hole instead of shifting the list
+        last = self.items.pop()
+        if last != user_id:
+            self.items[index] = last
+            self.positions[last] = index
+
+    def sample(self, exclude=None):
+        if not self.items or (len(self.items) == 1 and self.items[0] == exclude):
+            return None
+        while True:
+            user_id = random.choice(self.items)
+            if user_id != exclude:
+                return user_id
+
+
+def _negate(score):
+    if isinstance(score, tuple):
+        return tuple(-part for part in score)
+    return -score
+
+
+class GuildRankings:
+    """Per-guild leaderboards, updated as balances change instead of re-sorted per call.
+
+    Alongside the boards each guild keeps a pool of members `!rob` can pick:
+    not a bot and holding more than 0 coins.
+
+    A guild's boards are built ahead of time when the guild becomes
+    available, or by the first command that needs them (which waits for the
+    guild's member list to finish downloading first). Members are read a
+    batch per loop turn so a big guild doesn't stall the gateway. After that the
+    store reports every committed change and the Work cog reports members
+    joining and leaving.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.boards = {}  # guild_id -> {metric: Board}
+        self.pools = {}  # guild_id -> Pool of robbable user ids
+        self.guilds_of = {}  # user_id -> {guild_id, ...}
+        self.bots = set()
+        self._builds = {}  # guild_id -> task building its boards
+        self._changed = {}  # guild_id -> user ids changed while its boards were building
+        store.add_listener(self.on_change)
+
+    async def board(self, guild, metric="money"):
+        boards = self.boards.get(guild.id)
+        if boards is None:
+            boards = await self.build(guild)
+        return boards[metric]
+
+    async def rob_target(self, guild, exclude=None):
+        """A random robbable user id in the guild, never `exclude`"""
+        if guild.id not in self.boards:
+            await self.build(guild)
+        return self.pools[guild.id].sample(exclude)
+
+    async def build(self, guild):
+        """The guild's boards, building them first if needed; concurrent callers share one build"""
+        boards = self.boards.get(guild.id)
+        if boards is not None:
+            return boards
+        task = self._builds.get(guild.id)
+        if task is None:
+            task = self._builds[guild.id] = asyncio.create_task(self._build(guild))
+            task.add_done_callback(lambda _: self._builds.pop(guild.id, None))
+        # A cancelled command mustn't cancel the build the others are waiting on
+        return await asyncio.shield(task)
+
+    async def _build(self, guild):
+        # Members fetched by chunking don't fire on_member_join, so a board built from
+        # a half-chunked cache would miss them for good; finish the member list first
+        if not guild.chunked:
+            await guild.chunk()
+        changed = self._changed[guild.id] = set()
+        runs = {name: [] for name in METRICS}
+        pool = Pool()
+        data = self.store.data
+        members = list(guild.members)
+        try:
+            for start in range(0, len(members), BUILD_CHUNK):
+                entries = {name: [] for name in METRICS}
+                for member in members[start:start + BUILD_CHUNK]:
+                    user_id = str(member.id)
+                    if member.bot:
+                        self.bots.add(user_id)
+                    self.guilds_of.setdefault(user_id, set()).add(guild.id)
+                    record = data.get(user_id)
+                    if record is None:
+                        continue
+                    for name, score in METRICS.items():
+                        entries[name].append((_negate(score(record)), user_id))
+                    if record.money > 0 and not member.bot:
+                        pool.add(user_id)
+                for name, run in entries.items():
+                    run.sort()
+                    runs[name].append(run)
+                await asyncio.sleep(0)
+            boards = {name: await Board.from_runs(score, runs[name]) for name, score in METRICS.items()}
+        finally:
+            del self._changed[guild.id]
+        self.boards[guild.id] = boards
+        self.pools[guild.id] = pool
+        # Catch up on what changed behind the chunks already read
+        for user_id in changed:
+            member = guild.get_member(int(user_id))
+            if member is not None:
+                self.member_join(member)
+            else:
+                self._remove(guild.id, user_id)
+        return boards
+
+    # ---------- Updates ----------
+    def on_change(self, user_id, record):
+        for changed in self._changed.values():
+            changed.add(user_id)
+        for guild_id in self.guilds_of.get(user_id, ()):
+            boards = self.boards.get(guild_id)
+            if boards is None:
+                continue  # Still building, or gone; never fail the store's commit over it
+            for board in boards.values():
+                board.update(user_id, record)
+            self._update_pool(guild_id, user_id, record)
+
+    def _update_pool(self, guild_id, user_id, record):
+        if record.money > 0 and user_id not in self.bots:
+            self.pools[guild_id].add(user_id)
+        else:
+            self.pools[guild_id].remove(user_id)
+
+    def member_join(self, member):
+        boards = self.boards.get(member.guild.id)
+        if boards is None:
+            changed = self._changed.get(member.guild.id)
+            if changed is not None:
+                changed.add(str(member.id))
+            return  # Not built yet, it will pick the member up when it is
+        user_id = str(member.id)
+        if member.bot:
+            self.bots.add(user_id)
+        self.guilds_of.setdefault(user_id, set()).add(member.guild.id)
+        record = self.store.data.get(user_id)
+        if record is not None:
+            for board in boards.values():
+                board.update(user_id, record)
+            self._update_pool(member.guild.id, user_id, record)
+
+    def member_remove(self, member):
+        if member.guild.id in self.boards:
+            self._remove(member.guild.id, str(member.id))
+        else:
+            changed = self._changed.get(member.guild.id)
+            if changed is not None:
+                changed.add(str(member.id))
+
+    def _remove(self, guild_id, user_id):
+        guilds = self.guilds_of.get(user_id)
+        if guilds is not None:
+            guilds.discard(guild_id)
+            if not guilds:
+                del self.guilds_of[user_id]
+        for board in self.boards[guild_id].values():
+            board.remove(user_id)
+        self.pools[guild_id].remove(user_id)
+
+    def guild_remove(self, guild):
+        task = self._builds.pop(guild.id, None)
+        if task is not None:
+            task.cancel()
+        if self.boards.pop(guild.id, None) is None and task is None:
+            return
+        self.pools.pop(guild.id, None)
+        for member in guild.members:
+            guilds = self.guilds_of.get(str(member.id))
+            if guilds is not None:
+                guilds.discard(guild.id)
+                if not guilds:
+                    del self.guilds_of[str(member.id)]
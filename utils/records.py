@@ -0,0 +1,103 @@
+import calendar
+import time
+
+SCHEMA_VERSION = 2
+
+# Cooldown timestamps, stored as integer epoch seconds since schema v2
+TIME_FIELDS = (
+    "work", "daily", "weekly", "rob", "fish",
+    "last_play", "last_feed", "last_bathe", "last_xp"
+)
+
+# v1 kept timestamps as UTC strings in this format
+V1_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def now():
+    """Current time in the unit records use"""
+    return int(time.time())
+
+
+class UserRecord:
+    """One user's economy data.
+
+    __slots__ keeps a record to a fixed set of attributes, which is much
+    smaller than the dict per user the bot used to hold in memory.
+    """
+
+    __slots__ = (
+        "money", "xp", "level",
+        "work", "daily", "weekly", "rob", "fish",
+        "profile_image", "owned_images",
+        "pet", "pet_name", "last_play", "last_feed", "last_bathe",
+        "last_xp",
+        "games"
+    )
+
+    def __init__(self):
+        self.money = 0
+        self.xp = 0
+        self.level = 1
+        for field in TIME_FIELDS:
+            setattr(self, field, 0)
+        self.profile_image = None
+        self.owned_images = []
+        self.pet = None
+        self.pet_name = None
+        self.games = None  # str(channel id) -> game dict, only while a game is running
+
+    # ---------- Conversion ----------
+    @classmethod
+    def from_dict(cls, data):
+        """Build a record from stored JSON, migrating v1 string timestamps"""
+        record = cls()
+        for field, value in data.items():
+            record.set(field, value)
+        return record
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def set(self, field, value):
+        """Assign a stored value by name; unknown v1 keys are dropped"""
+        if field not in self.__slots__:
+            return
+        if field in TIME_FIELDS and isinstance(value, str):
+            value = parse_v1_time(value)
+        elif field == "owned_images":
+            value = list(value)
+        elif field == "games" and value is not None:
+            value = dict(value)
+        setattr(self, field, value)
+
+    # ---------- Transactions ----------
+    def copy(self):
+        other = UserRecord.__new__(UserRecord)
+        for field in self.__slots__:
+            setattr(other, field, getattr(self, field))
+        other.owned_images = list(self.owned_images)
+        if self.games is not None:
+            # Game dicts are replaced, never edited in place, so a shallow copy will do
+            other.games = dict(self.games)
+        return other
+
+    def restore(self, other):
+        for field in self.__slots__:
+            setattr(self, field, getattr(other, field))
+
+    def diff(self, before):
+        """{field: new value} for every field that differs from `before`"""
+        return {
+            field: getattr(self, field)
+            for field in self.__slots__
+            if getattr(self, field) != getattr(before, field)
+        }
+
+
+def parse_v1_time(value):
+    return calendar.timegm(time.strptime(value, V1_TIME_FORMAT))
+
+
+def is_v1(data):
+    """True if a stored user dict still uses the v1 string timestamps"""
+    return any(isinstance(data.get(field), str) for field in TIME_FIELDS)
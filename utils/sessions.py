@@ -0,0 +1,121 @@
+import asyncio
+
+
+class SessionActive(Exception):
+    """Raised when the user already has a session running in that channel"""
+
+
+class Session:
+    """One user's multi-step game in one channel"""
+
+    __slots__ = ("channel_id", "user_id", "kind", "words", "timeout", "timer", "busy")
+
+    def __init__(self, channel_id, user_id, kind, words, timeout):
+        self.channel_id = channel_id
+        self.user_id = user_id
+        self.kind = kind
+        self.words = words
+        self.timeout = timeout
+        self.timer = None
+        self.busy = False
+
+    @property
+    def key(self):
+        return (self.channel_id, self.user_id)
+
+
+class SessionRouter:
+    """Routes chat replies ("hit", "stand", ...) to running game sessions.
+
+    Sessions are indexed by (channel id, user id), so a message costs one
+    dict lookup however many games are running, where a `wait_for` per
+    game would run every game's check against every message.
+
+    A session only routes; the game itself lives wherever the cog keeps
+    it (the gambling games keep theirs in the player's record). The router
+    is on the bot, so sessions outlive a reload of the cog that opened
+    them. A cog registers an action and a timeout handler per session
+    kind, and registering again on reload swaps in the new cog's:
+
+        async def on_action(session, channel, word)
+        async def on_timeout(session, channel)
+
+    Each session has an idle timeout, restarted on every action. The
+    session is closed before `on_timeout` runs. Handlers call `close`
+    once their game is over.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.sessions = {}
+        self.handlers = {}
+        self.tasks = set()  # running timeout handlers, so they aren't garbage collected
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def register(self, kind, on_action, on_timeout):
+        # Re-registering (e.g. on cog reload) just replaces the old handlers
+        self.handlers[kind] = (on_action, on_timeout)
+
+    def get(self, channel_id, user_id):
+        return self.sessions.get((channel_id, user_id))
+
+    def open(self, channel_id, user_id, kind, words, timeout=30.0):
+        key = (channel_id, user_id)
+        if key in self.sessions:
+            raise SessionActive()
+        session = self.sessions[key] = Session(channel_id, user_id, kind, frozenset(words), timeout)
+        self.touch(session)
+        return session
+
+    def touch(self, session, timeout=None):
+        """Restart the session's idle timeout (`timeout` overrides it just this once)"""
+        if session.timer is not None:
+            session.timer.cancel()
+        loop = asyncio.get_running_loop()
+        delay = session.timeout if timeout is None else timeout
+        session.timer = loop.call_later(delay, self._expire, session)
+
+    def close(self, session):
+        if self.sessions.get(session.key) is session:
+            del self.sessions[session.key]
+        if session.timer is not None:
+            session.timer.cancel()
+            session.timer = None
+
+    def unregister(self, kind):
+        """Drop a kind's handlers and close its sessions (e.g. on cog unload)"""
+        self.handlers.pop(kind, None)
+        for session in list(self.sessions.values()):
+            if session.kind == kind:
+                self.close(session)
+
+    # ---------- Dispatch ----------
+    async def on_message(self, message):
+        session = self.sessions.get((message.channel.id, message.author.id))
+        if session is None or session.busy:
+            return
+        word = message.content.strip().lower()
+        if word not in session.words:
+            return
+        on_action, _ = self.handlers[session.kind]
+        # One action at a time per session; a double "hit" sent while the first
+        # is still being applied is dropped instead of racing it
+        session.busy = True
+        try:
+            self.touch(session)
+            await on_action(session, message.channel, word)
+        finally:
+            session.busy = False
+
+    def _expire(self, session):
+        session.timer = None
+        if self.sessions.get(session.key) is not session:
+            return
+        self.close(session)
+        _, on_timeout = self.handlers[session.kind]
+        channel = self.bot.get_channel(session.channel_id)
+        task = asyncio.create_task(on_timeout(session, channel))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
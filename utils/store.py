@@ -0,0 +1,232 @@
+import asyncio
+import contextlib
+import logging
+import time
+
+from utils.metrics import Histogram
+from utils.records import UserRecord, is_v1
+
+log = logging.getLogger(__name__)
+
+
+class Store:
+    """Economy data shared by every cog.
+
+    The backend (see utils/backends.py) is read once at startup and every
+    read is served from memory. Changed users are remembered and written
+    back by a background task, either every `flush_interval` seconds or as
+    soon as `batch_size` users have changed.
+
+    With a journal (see utils/journal.py) every committed change is also
+    appended to the log straight away and a transaction only returns once
+    its entries are fsynced. The background flush becomes a compaction:
+    snapshot to the backend, then drop the old log segments.
+    """
+
+    def __init__(self, backend, journal=None, flush_interval=30, batch_size=100):
+        self.backend = backend
+        self.journal = journal
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.data = {}
+        self.dirty = set()
+        self._locks = {}
+        self._listeners = []
+        self._wake = None
+        self._task = None
+        # I/O numbers for !stats and /metrics
+        self.load_seconds = 0.0
+        self.flush_seconds = Histogram()
+        self.flush_errors = 0
+        self.bytes_written = 0
+
+    # ---------- Loading ----------
+    def load(self):
+        started = time.perf_counter()
+        raw = self.backend.load()
+        if self.journal is not None:
+            # Whatever the log holds is newer than the snapshot
+            self.dirty.update(self.journal.replay(raw))
+            self.journal.open()
+
+        self.data = {}
+        for user_id, stored in raw.items():
+            if is_v1(stored):
+                # Rewrite v1 users in the new shape on the next snapshot
+                self.dirty.add(user_id)
+            self.data[user_id] = UserRecord.from_dict(stored)
+        self.load_seconds = time.perf_counter() - started
+
+    # ---------- Access ----------
+    def get_user(self, user_id):
+        """Return the live record for a user, creating it if needed.
+
+        Use this for reads only; changes go through `user()`/`users()`.
+        """
+        user_id = str(user_id)
+        record = self.data.get(user_id)
+        if record is None:
+            record = self.data[user_id] = UserRecord()
+        return record
+
+    def mark_dirty(self, *user_ids):
+        """Schedule users for the next write-behind flush"""
+        for user_id in user_ids:
+            self.dirty.add(str(user_id))
+        if len(self.dirty) >= self.batch_size and self._wake is not None:
+            self._wake.set()
+
+    def add_listener(self, listener):
+        """Call `listener(user_id, record)` after every committed change"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    # ---------- Transactions ----------
+    def user(self, user_id, durable=True):
+        """Lock one user for a read-modify-write.
+
+            async with store.user(ctx.author.id) as user:
+                user.money += 10
+
+        Keep the block short and don't await Discord inside it.
+        With durable=False the change is journaled but not waited on; it is
+        written out with the next durable commit or compaction.
+        """
+        return self._transaction((user_id,), durable, single=True)
+
+    def users(self, *user_ids, durable=True):
+        """Lock several users at once, yielding their records in the given order"""
+        return self._transaction(user_ids, durable)
+
+    @contextlib.asynccontextmanager
+    async def _transaction(self, user_ids, durable, single=False):
+        user_ids = [str(user_id) for user_id in user_ids]
+        # Always lock in the same order so two transactions can't deadlock
+        ordered = sorted(set(user_ids))
+        locks = [self._acquire_lock(user_id) for user_id in ordered]
+        held = []
+        try:
+            for lock in locks:
+                await lock.acquire()
+                held.append(lock)
+        except BaseException:
+            for lock in held:
+                lock.release()
+            self._drop_locks(ordered)
+            raise
+
+        records = [self.get_user(user_id) for user_id in user_ids]
+        before = {user_id: self.data[user_id].copy() for user_id in ordered}
+        changed = []
+        try:
+            yield records[0] if single else tuple(records)
+        except BaseException:
+            # Roll back so a failed command never leaves half-applied changes
+            for user_id, saved in before.items():
+                self.data[user_id].restore(saved)
+            raise
+        else:
+            diffs = {user_id: self.data[user_id].diff(before[user_id]) for user_id in ordered}
+            changed = [user_id for user_id in ordered if diffs[user_id]]
+            if self.journal is not None:
+                for user_id in changed:
+                    self.journal.append(user_id, diffs[user_id], flush=durable)
+            if changed:
+                self.mark_dirty(*changed)
+            for user_id in changed:
+                for listener in self._listeners:
+                    listener(user_id, self.data[user_id])
+        finally:
+            for lock in locks:
+                lock.release()
+            self._drop_locks(ordered)
+
+        # Wait for the journal fsync outside the locks; concurrent commits share it
+        if changed and durable and self.journal is not None:
+            await self.journal.sync()
+
+    def _acquire_lock(self, user_id):
+        entry = self._locks.get(user_id)
+        if entry is None:
+            entry = self._locks[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        return entry[0]
+
+    def _drop_locks(self, user_ids):
+        # Forget locks nobody is holding or waiting on, so the dict stays small
+        for user_id in user_ids:
+            entry = self._locks[user_id]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[user_id]
+
+    # ---------- Persistence ----------
+    def start(self):
+        """Start the background flush task (safe to call more than once)"""
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self.dirty:
+                dirty = self.dirty
+                started = time.perf_counter()
+                try:
+                    payload, old_segments = self._snapshot()
+                    self.bytes_written += await asyncio.to_thread(self.backend.write, payload)
+                except Exception:
+                    # Old log segments are kept, so nothing is lost; retry next round.
+                    # Never let this end the task, or compaction stops for good
+                    log.exception("Flushing %d users failed, retrying next round", len(dirty))
+                    self.flush_errors += 1
+                    self.dirty |= dirty
+                    continue
+                self.flush_seconds.observe(time.perf_counter() - started)
+                if old_segments:
+                    self.journal.discard(old_segments)
+
+    def _snapshot(self):
+        # Encode changed users on the event loop so the thread never sees a record mid-update
+        payload = self.backend.prepare(self.data, self.dirty)
+        self.dirty = set()
+        # Changes from here on go to a fresh segment that outlives this snapshot
+        old_segments = self.journal.rotate() if self.journal is not None else []
+        return payload, old_segments
+
+    def flush(self):
+        """Write pending changes right away (used on shutdown)"""
+        if self.dirty:
+            started = time.perf_counter()
+            payload, old_segments = self._snapshot()
+            self.bytes_written += self.backend.write(payload)
+            self.flush_seconds.observe(time.perf_counter() - started)
+            if old_segments:
+                self.journal.discard(old_segments)
+
+    def stats(self):
+        stats = {
+            "users": len(self.data),
+            "dirty": len(self.dirty),
+            "load_seconds": self.load_seconds,
+            "flush_seconds": self.flush_seconds,
+            "flush_errors": self.flush_errors,
+            "bytes_written": self.bytes_written
+        }
+        if self.journal is not None:
+            stats["journal_bytes_written"] = self.journal.bytes_written
+            stats["journal_sync_seconds"] = self.journal.sync_seconds
+        return stats
+
+    def close(self):
+        self.flush()
+        if self.journal is not None:
+            self.journal.close()
+        self.backend.close()